@@ -0,0 +1,228 @@
+import os
+import time
+import asyncio
+from collections import deque
+
+# Largest binary frame accepted from a client
+AUDIO_CHUNK_BYTES = int(os.getenv("AUDIO_CHUNK_BYTES", "32768"))
+# Bytes buffered per stream before the receiver waits for the transcriber
+AUDIO_BUFFER_BYTES = int(os.getenv("AUDIO_BUFFER_BYTES", "262144"))
+
+
+class RingBuffer:
+    """Fixed-capacity byte ring: memory stays bounded however long the audio is."""
+
+    def __init__(self, capacity):
+        self.buffer = bytearray(capacity)
+        self.capacity = capacity
+        self.start = 0
+        self.size = 0
+
+    def free(self):
+        return self.capacity - self.size
+
+    def write(self, data):
+        """Copy as much of ``data`` as fits; returns the number of bytes written."""
+        count = min(len(data), self.free())
+        end = (self.start + self.size) % self.capacity
+        first = min(count, self.capacity - end)
+        self.buffer[end:end + first] = data[:first]
+        self.buffer[:count - first] = data[first:count]
+        self.size += count
+        return count
+
+    def read(self, limit):
+        """Remove and return up to ``limit`` bytes."""
+        count = min(limit, self.size)
+        first = min(count, self.capacity - self.start)
+        data = bytes(self.buffer[self.start:self.start + first]) + bytes(self.buffer[:count - first])
+        self.start = (self.start + count) % self.capacity
+        self.size -= count
+        return data
+
+
+class AudioMetrics:
+    def __init__(self, samples=1000):
+        self.streams = 0
+        self.active_streams = 0
+        self.bytes_received = 0
+        self.bytes_buffered = 0
+        self.peak_bytes_buffered = 0
+        self.chunks = 0
+        self.backpressure_waits = 0
+        # Seconds from a chunk arriving to the transcriber finishing with it
+        self.chunk_latency = deque(maxlen=samples)
+
+    def stats(self):
+        latency = sorted(self.chunk_latency)
+
+        def pct(p):
+            return round(latency[min(len(latency) - 1, int(p / 100 * len(latency)))] * 1000, 2) if latency else None
+
+        return {
+            "streams": self.streams,
+            "active_streams": self.active_streams,
+            "bytes_received": self.bytes_received,
+            "bytes_buffered": self.bytes_buffered,
+            "peak_bytes_buffered": self.peak_bytes_buffered,
+            "chunks": self.chunks,
+            "backpressure_waits": self.backpressure_waits,
+            "chunk_latency_p50_ms": pct(50),
+            "chunk_latency_p95_ms": pct(95),
+            "chunk_latency_p99_ms": pct(99),
+        }
+
+
+audio_metrics = AudioMetrics()
+
+
+class AudioStream:
+    """One utterance flowing from the socket through a ring buffer to a transcriber.
+
+    ``write`` waits while the buffer is full, so a slow transcriber pauses
+    reading from the socket instead of growing memory.
+    """
+
+    def __init__(self, transcription, capacity=AUDIO_BUFFER_BYTES, frame_bytes=AUDIO_CHUNK_BYTES, metrics=audio_metrics):
+        self.transcription = transcription
+        self.ring = RingBuffer(capacity)
+        self.frame_bytes = frame_bytes
+        self.metrics = metrics
+        self.changed = asyncio.Condition()
+        self.closed = False
+        self.written = 0
+        self.consumed = 0
+        # (end offset, arrival time) of chunks not yet fully transcribed
+        self.arrivals = deque()
+        metrics.streams += 1
+        metrics.active_streams += 1
+        self.consumer = asyncio.create_task(self._consume())
+
+    async def write(self, chunk):
+        arrived = time.perf_counter()
+        view = memoryview(chunk)
+        self.metrics.bytes_received += len(view)
+        self.metrics.chunks += 1
+        self.arrivals.append((self.written + len(view), arrived))
+        async with self.changed:
+            while view:
+                if not self.ring.free():
+                    self.metrics.backpressure_waits += 1
+                    await self.changed.wait_for(lambda: self.ring.free() or self.consumer.done())
+                    if self.consumer.done():
+                        # Surface the transcriber's error instead of waiting forever
+                        self.consumer.result()
+                written = self.ring.write(view)
+                view = view[written:]
+                self.written += written
+                self._buffered(written)
+                self.changed.notify_all()
+
+    async def _consume(self):
+        try:
+            while True:
+                async with self.changed:
+                    await self.changed.wait_for(lambda: self.ring.size or self.closed)
+                    if not self.ring.size:
+                        return
+                    frame = self.ring.read(self.frame_bytes)
+                    self._buffered(-len(frame))
+                    self.changed.notify_all()
+
+                await self.transcription.process(frame)
+                self.consumed += len(frame)
+                done = time.perf_counter()
+                while self.arrivals and self.arrivals[0][0] <= self.consumed:
+                    self.metrics.chunk_latency.append(done - self.arrivals.popleft()[1])
+        except Exception:
+            # Wake a writer blocked on a full buffer so it sees the failure
+            async with self.changed:
+                self.changed.notify_all()
+            raise
+
+    def _buffered(self, delta):
+        self.metrics.bytes_buffered += delta
+        self.metrics.peak_bytes_buffered = max(self.metrics.peak_bytes_buffered, self.metrics.bytes_buffered)
+
+    async def finish(self):
+        """Flush the buffer and return the transcript."""
+        async with self.changed:
+            self.closed = True
+            self.changed.notify_all()
+        try:
+            await self.consumer
+            return await self.transcription.result()
+        finally:
+            self._release()
+
+    def abort(self):
+        self.consumer.cancel()
+        self._release()
+
+    def _release(self):
+        if self.ring is not None:
+            self._buffered(-self.ring.size)
+            self.ring = None
+            self.metrics.active_streams -= 1
+
+
+class Transcriber:
+    """Turns audio into text.
+
+    ``start(format, sample_rate)`` returns a transcription object with
+    ``async process(frame)``, called for each buffered frame, and
+    ``async result()``, called once at the end.
+    """
+
+    name = "base"
+
+    def start(self, audio_format, sample_rate):
+        raise NotImplementedError
+
+
+class FakeTranscription:
+    def __init__(self, transcriber):
+        self.transcriber = transcriber
+        self.bytes = 0
+
+    async def process(self, frame):
+        self.bytes += len(frame)
+        if self.transcriber.bytes_per_sec > 0:
+            await asyncio.sleep(len(frame) / self.transcriber.bytes_per_sec)
+
+    async def result(self):
+        return self.transcriber.transcript
+
+
+class FakeTranscriber(Transcriber):
+    """Local stand-in: no model, returns a fixed transcript.
+
+    ``bytes_per_sec`` simulates how fast a real model would consume audio,
+    which makes backpressure easy to exercise.
+    """
+
+    name = "fake"
+
+    def __init__(self, transcript="I'd like to talk about how I've been feeling.", bytes_per_sec=0):
+        self.transcript = transcript
+        self.bytes_per_sec = bytes_per_sec
+
+    def start(self, audio_format, sample_rate):
+        return FakeTranscription(self)
+
+
+def get_transcriber():
+    """Build the transcriber selected by the TRANSCRIBER environment variable.
+
+    Returns None when it is unset: audio is then rejected rather than
+    answered with a made-up transcript.
+    """
+    name = os.getenv("TRANSCRIBER", "").lower()
+    if not name:
+        return None
+    if name == "fake":
+        return FakeTranscriber(
+            transcript=os.getenv("FAKE_TRANSCRIPT", "I'd like to talk about how I've been feeling."),
+            bytes_per_sec=float(os.getenv("FAKE_TRANSCRIBE_BYTES_PER_SEC", "0")),
+        )
+    raise ValueError(f"Unknown TRANSCRIBER: {name}")
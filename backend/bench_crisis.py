@@ -0,0 +1,52 @@
+"""Micro-benchmark for the crisis pre-filter.
+
+Run with ``python bench_crisis.py``. Prints the per-message cost of
+``CrisisDetector.check`` for growing phrase lists and message lengths.
+"""
+import random
+import string
+import time
+
+from crisis import DEFAULT_PHRASES, CrisisDetector, RiskClassifier
+
+MESSAGES = [
+    "I had a pretty good day today.",
+    "Work has been piling up and I can't keep up, I haven't been sleeping well and everything feels heavy. "
+    "I keep telling myself it will get better but honestly I don't know anymore.",
+    "I just feel so hopeless and alone lately, like I'm a burden to everyone around me.",
+    "Sometimes I think everyone would be better off without me.",
+]
+
+
+def random_phrases(count, rng):
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(2000)]
+    return [" ".join(rng.choices(words, k=rng.randint(1, 4))) for _ in range(count)]
+
+
+def bench(detector, messages, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message in messages:
+            detector.check(message)
+    return (time.perf_counter() - start) / (rounds * len(messages))
+
+
+def main():
+    rng = random.Random(42)
+    long_message = " ".join(MESSAGES) * 4
+    print(f"{'phrases':>8} {'classifier':>10} {'build ms':>9} {'avg us/msg':>11} {'long msg us':>12}")
+    for count in (0, 1000, 5000, 20000):
+        phrases = DEFAULT_PHRASES + random_phrases(count, rng)
+        for classifier in (None, RiskClassifier()):
+            start = time.perf_counter()
+            detector = CrisisDetector(phrases, classifier)
+            build = time.perf_counter() - start
+            per_message = bench(detector, MESSAGES, 2000)
+            per_long = bench(detector, [long_message], 500)
+            print(f"{len(phrases):>8} {'yes' if classifier else 'no':>10} {build * 1000:>9.1f} "
+                  f"{per_message * 1e6:>11.1f} {per_long * 1e6:>12.1f}")
+    print(f"(long message is {len(long_message)} characters)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark for the clinician batch report engine.
+
+Run with ``python bench_reports.py``. For 10, 1k and 10k patients with 90
+days of rollups each it times:
+
+- loop: one ``JournalStore.report`` call per patient (per-patient endpoint)
+- cold: ``ReportEngine.batch`` with an empty cache
+- warm: the same batch again, served from the cache
+- etag: the version lookup behind a 304 response
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from journal_store import JournalStore
+from reports import ReportEngine
+
+DAYS = 90
+
+
+def populate(store, patients, rng):
+    today = date.today()
+    days = [(today - timedelta(days=i)).isoformat() for i in range(DAYS)]
+    rollups = []
+    stats = []
+    for p in range(patients):
+        user_id = f"patient-{p}"
+        for day in days:
+            if rng.random() < 0.7:
+                moods = rng.randint(1, 2)
+                rollups.append((user_id, day, rng.randint(0, 2), moods, moods * rng.uniform(1, 5)))
+        stats.append((user_id, 0, 0, days[-1], days[0], 3, 5, "Stable", 1))
+    with store.conn:
+        store.conn.executemany(
+            "INSERT INTO daily_rollups (user_id, day, journal_count, mood_count, mood_sum) VALUES (?, ?, ?, ?, ?)",
+            rollups,
+        )
+        store.conn.executemany("INSERT INTO user_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", stats)
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    await coro
+    return (time.perf_counter() - start) * 1000
+
+
+async def run(patients, rng):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = JournalStore(os.path.join(tmp, "bench.db"))
+        populate(store, patients, rng)
+        engine = ReportEngine(store)
+        ids = [f"patient-{p}" for p in range(patients)]
+
+        async def loop():
+            for patient_id in ids:
+                await store.report(patient_id, 30)
+
+        loop_ms = await timed(loop())
+        cold_ms = await timed(engine.batch(ids, 30, 30))
+        warm_ms = await timed(engine.batch(ids, 30, 30))
+
+        async def etag():
+            stats = await engine.patient_stats(ids)
+            engine.etag(ids, stats, 30, 30)
+
+        etag_ms = await timed(etag())
+        store.conn.close()
+    return loop_ms, cold_ms, warm_ms, etag_ms
+
+
+def main():
+    rng = random.Random(7)
+    print(f"{'patients':>9} {'loop ms':>10} {'cold ms':>10} {'warm ms':>10} {'etag ms':>10}")
+    for patients in (10, 1000, 10000):
+        loop_ms, cold_ms, warm_ms, etag_ms = asyncio.run(run(patients, rng))
+        print(f"{patients:>9} {loop_ms:>10.1f} {cold_ms:>10.1f} {warm_ms:>10.1f} {etag_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
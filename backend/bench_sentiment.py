@@ -0,0 +1,74 @@
+"""Benchmark for the sentiment pipeline.
+
+Run with ``python bench_sentiment.py``. Prints scored messages/sec for
+several batch sizes and process pool sizes, measured end to end from
+``submit`` to the sink.
+"""
+import asyncio
+import os
+import random
+import time
+
+from sentiment import SentimentPipeline
+
+MESSAGES = 20000
+
+# Mixed-tone chat and journal lines; each benchmark message joins three of them
+SENTENCES = [
+    "I'm feeling overwhelmed lately.",
+    "Work has been piling up and I can't keep up.",
+    "I haven't been sleeping well either.",
+    "I had a good day today.",
+    "I went for a walk and talked to a friend.",
+    "I'm anxious about my exams next week.",
+    "My family has been really supportive.",
+    "I feel lonely since I moved to a new city.",
+    "Therapy is helping, slowly.",
+    "I got angry at my partner and I regret it.",
+    "Nothing really happened, it was an ordinary day.",
+    "I'm proud that I kept my routine this week.",
+]
+
+
+async def run(batch_size, pool_size, messages):
+    done = asyncio.Event()
+    scored = 0
+
+    async def sink(results):
+        nonlocal scored
+        scored += len(results)
+        if scored >= len(messages):
+            done.set()
+
+    pipeline = SentimentPipeline(sink, batch_size=batch_size, max_delay=0.005,
+                                 pool_size=pool_size, queue_size=len(messages))
+    # Warm up the worker processes so their start-up is not measured
+    pipeline.submit("chat", "bench", "2024-01-01", "warm up")
+    while scored < 1:
+        await asyncio.sleep(0.01)
+    scored = 0
+
+    start = time.perf_counter()
+    for text in messages:
+        pipeline.submit("chat", "bench", "2024-01-01", text)
+    await done.wait()
+    elapsed = time.perf_counter() - start
+    pipeline.close()
+    return len(messages) / elapsed
+
+
+def main():
+    rng = random.Random(3)
+    messages = [" ".join(rng.choices(SENTENCES, k=3)) for _ in range(MESSAGES)]
+    cores = os.cpu_count() or 1
+    pools = sorted({1, 2, min(4, cores), cores})
+
+    print(f"{MESSAGES} messages, {cores} cores")
+    print(f"{'batch':>6} " + " ".join(f"{f'pool={p} msg/s':>15}" for p in pools))
+    for batch_size in (1, 8, 32, 128, 512):
+        rates = [asyncio.run(run(batch_size, pool, messages)) for pool in pools]
+        print(f"{batch_size:>6} " + " ".join(f"{rate:>15.0f}" for rate in rates))
+
+
+if __name__ == "__main__":
+    main()
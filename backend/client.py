@@ -1,36 +1,70 @@
+import argparse
 import asyncio
-import websockets
 import json
+import os
+import platform
+import subprocess
+import time
+
+import websockets
+
+DEFAULT_URI = "ws://localhost:8000/ws/webclient"
+# Must not exceed the server's AUDIO_CHUNK_BYTES
+AUDIO_CHUNK_BYTES = 32768
+
+SYSTEM_PROMPT = (
+    "You are a compassionate and emotionally intelligent mental health assistant. "
+    "Your goal is to help users talk through their feelings, understand their emotions, "
+    "and feel heard without judgment. Ask open-ended and gentle follow-up questions when appropriate, "
+    "encourage self-reflection, and validate the user's experience. Never diagnose or offer medical advice. "
+    "If a user expresses signs of crisis or self-harm, recommend speaking to a trusted person or contacting a local helpline. "
+    "Maintain a calm, kind, and supportive tone in every message."
+)
+
+# Scripted conversations replayed by the load generator (override with --script)
+DEFAULT_SCRIPT = [
+    [
+        "I'm feeling overwhelmed lately.",
+        "Work has been piling up and I can't keep up.",
+        "I haven't been sleeping well either.",
+    ],
+    [
+        "I had a good day today.",
+        "I went for a walk and talked to a friend.",
+        "How can I keep this going?",
+    ],
+    [
+        "I feel anxious before exams.",
+        "My heart races and I can't focus.",
+        "What can I try tonight?",
+    ],
+]
 
-async def connect_mental_health_chatbot():
-    try:
-        # Updated to connect to localhost WebSocket server
-        uri = "ws://localhost:8000/ws/localvscodeclient"  # Change this line
 
+def config_message(stream=True):
+    return {
+        "type": "config",
+        "config": {
+            "systemPrompt": SYSTEM_PROMPT,
+            "stream": stream,
+        }
+    }
+
+
+async def connect_mental_health_chatbot(uri=DEFAULT_URI, audio=False):
+    """Interactive single-user chat from the terminal."""
+    try:
         async with websockets.connect(uri) as websocket:
             print(f"Connected to {uri}")
 
             # 1. Send Configuration (Mental Health Chatbot Setup)
-            config = {
-                "type": "config",
-                "config": {
-                    "systemPrompt": (
-                        "You are a compassionate and emotionally intelligent mental health assistant. "
-                        "Your goal is to help users talk through their feelings, understand their emotions, "
-                        "and feel heard without judgment. Ask open-ended and gentle follow-up questions when appropriate, "
-                        "encourage self-reflection, and validate the user's experience. Never diagnose or offer medical advice. "
-                        "If a user expresses signs of crisis or self-harm, recommend speaking to a trusted person or contacting a local helpline. "
-                        "Maintain a calm, kind, and supportive tone in every message."
-                    )
-                }
-            }
-            await websocket.send(json.dumps(config))
+            await websocket.send(json.dumps(config_message(stream=True)))
             print("Sent configuration.")
 
             # 2. Send user text input
             async def send_user_input():
                 while True:
-                    user_text = input("You (in VSCode): ")
+                    user_text = await asyncio.to_thread(input, "You: ")
                     if not user_text:
                         break
                     message = {"type": "text", "data": user_text}
@@ -42,9 +76,14 @@ async def connect_mental_health_chatbot():
                     try:
                         response = json.loads(message)
                         if response.get("type") == "text" and response.get("text"):
-                            print(f"Assistant: {response['text']}")
+                            print(response["text"], end="", flush=True)
                         elif response.get("type") == "turn_complete":
-                            print("Assistant turn complete.")
+                            print()
+                        elif response.get("type") == "transcript":
+                            print(f"You said: {response['text']}")
+                        elif response.get("type") == "busy":
+                            print("Server busy, your message is queued." if response.get("queued")
+                                  else "Server busy, please try again.")
                         elif response.get("type") == "error" and response.get("message"):
                             print(f"Error: {response['message']}")
                     except json.JSONDecodeError:
@@ -55,27 +94,23 @@ async def connect_mental_health_chatbot():
             # 4. Handle Audio Input
             async def send_audio_input():
                 while True:
-                    audio_file = input("Enter path to audio file (or type 'exit' to quit): ")
+                    audio_file = await asyncio.to_thread(input, "Enter path to audio file (or type 'exit' to quit): ")
                     if audio_file.lower() == "exit":
                         break
-                    import base64
-                    
-                    with open(audio_file, "rb") as f:
-                        audio_data = f.read()
-                        encoded_audio = base64.b64encode(audio_data).decode("utf-8")
-                        message = {"type": "audio", "data": encoded_audio}
-                        await websocket.send(json.dumps(message))
-            
+                    await send_audio_file(websocket, audio_file)
+
             # Run sending and receiving concurrently
-            user_input_task = asyncio.create_task(send_user_input())
-            audio_input_task = asyncio.create_task(send_audio_input())
+            input_task = asyncio.create_task(send_audio_input() if audio else send_user_input())
+            receive_responses_task = asyncio.create_task(receive_responses())
             try:
-                receive_responses_task = asyncio.create_task(receive_responses())
-                await asyncio.gather(receive_responses_task, return_exceptions=True)
+                await asyncio.wait(
+                    [input_task, receive_responses_task],
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
             finally:
-                user_input_task.cancel()
-                audio_input_task.cancel()
-                await asyncio.gather(user_input_task, audio_input_task, return_exceptions=True)
+                input_task.cancel()
+                receive_responses_task.cancel()
+                await asyncio.gather(input_task, receive_responses_task, return_exceptions=True)
 
     except websockets.exceptions.ConnectionClosedError as e:
         print(f"Connection closed unexpectedly: {e}")
@@ -83,11 +118,253 @@ async def connect_mental_health_chatbot():
         print("Connection refused. Ensure the server is running and the local WebSocket is accessible.")
     except Exception as e:
         print(f"An error occurred: {e}")
+    print("Connection closed.")
+
+
+async def send_audio_file(websocket, path, chunk_bytes=AUDIO_CHUNK_BYTES):
+    """Stream a file as fixed-size binary frames between audio_start and audio_end.
+
+    The file is read chunk by chunk into one reusable buffer, so memory use
+    does not depend on the file size.
+    """
+    audio_format = os.path.splitext(path)[1].lstrip(".").lower() or "pcm16"
+    await websocket.send(json.dumps({"type": "audio_start", "format": audio_format, "sampleRate": 16000}))
+    buffer = bytearray(chunk_bytes)
+    view = memoryview(buffer)
+    with open(path, "rb") as f:
+        while True:
+            count = await asyncio.to_thread(f.readinto, buffer)
+            if not count:
+                break
+            # websockets sends bytes-like objects as binary frames
+            await websocket.send(bytes(view[:count]))
+    await websocket.send(json.dumps({"type": "audio_end"}))
+
+
+# ---------------------------------------------------------------------------
+# Headless load generator
+# ---------------------------------------------------------------------------
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(values):
+    """p50/p95/p99/mean/max in milliseconds."""
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 2),
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(max(values) * 1000, 2),
+    }
+
+
+def read_rss_kb(pid):
+    """Resident set size of another process, from /proc (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+class LoadStats:
+    def __init__(self):
+        self.connect_times = []
+        self.ttft = []
+        self.turn_latency = []
+        self.turns = 0
+        self.busy_frames = 0
+        self.rejected = 0
+        self.errors = []
+        self.rss_samples = []
+
+
+async def run_session(uri, conversation, stats, think_time, turn_timeout):
+    started = time.perf_counter()
+    try:
+        websocket = await websockets.connect(uri, max_size=None)
+    except Exception as e:
+        stats.errors.append(f"connect: {e}")
+        return
+    stats.connect_times.append(time.perf_counter() - started)
+
+    try:
+        await websocket.send(json.dumps(config_message(stream=True)))
+        for text in conversation:
+            sent_at = time.perf_counter()
+            first_token_at = None
+            failed = False
+            await websocket.send(json.dumps({"type": "text", "data": text}))
+            while True:
+                raw = await asyncio.wait_for(websocket.recv(), turn_timeout)
+                if isinstance(raw, bytes):
+                    continue
+                response = json.loads(raw)
+                kind = response.get("type")
+                if kind == "text" and first_token_at is None:
+                    first_token_at = time.perf_counter()
+                elif kind == "busy":
+                    stats.busy_frames += 1
+                    if not response.get("queued"):
+                        stats.rejected += 1
+                        break
+                elif kind == "error":
+                    # The server still closes a failed turn with turn_complete; read up to it
+                    stats.errors.append(response.get("message", "error"))
+                    failed = True
+                elif kind == "turn_complete":
+                    if failed:
+                        break
+                    done_at = time.perf_counter()
+                    stats.turns += 1
+                    stats.turn_latency.append(done_at - sent_at)
+                    if first_token_at is not None:
+                        stats.ttft.append(first_token_at - sent_at)
+                    break
+            if think_time:
+                await asyncio.sleep(think_time)
+    except Exception as e:
+        stats.errors.append(f"{type(e).__name__}: {e}")
     finally:
-        if 'websocket' in locals() and websocket.open:
-            await websocket.close()
-        print("Connection closed.")
+        await websocket.close()
+
+
+async def sample_rss(pid, stats, interval=0.5):
+    while True:
+        rss = read_rss_kb(pid)
+        if rss is not None:
+            stats.rss_samples.append(rss)
+        await asyncio.sleep(interval)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_load(args):
+    script = DEFAULT_SCRIPT
+    if args.script:
+        with open(args.script) as f:
+            script = json.load(f)
+
+    stats = LoadStats()
+    sampler = None
+    if args.server_pid:
+        sampler = asyncio.create_task(sample_rss(args.server_pid, stats))
+
+    started = time.perf_counter()
+    tasks = []
+    for i in range(args.sessions):
+        conversation = script[i % len(script)] * args.repeat
+        tasks.append(asyncio.create_task(
+            run_session(args.uri, conversation, stats, args.think_time, args.turn_timeout)
+        ))
+        if args.ramp:
+            await asyncio.sleep(args.ramp / args.sessions)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    if sampler:
+        sampler.cancel()
+        await asyncio.gather(sampler, return_exceptions=True)
+
+    return {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "params": {
+            "uri": args.uri,
+            "sessions": args.sessions,
+            "repeat": args.repeat,
+            "ramp_s": args.ramp,
+            "think_time_s": args.think_time,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "connections": len(stats.connect_times),
+        "connections_per_sec": round(len(stats.connect_times) / elapsed, 2) if elapsed else None,
+        "connect_latency": summarize(stats.connect_times),
+        "turns": stats.turns,
+        "turns_per_sec": round(stats.turns / elapsed, 2) if elapsed else None,
+        "time_to_first_token": summarize(stats.ttft),
+        "turn_latency": summarize(stats.turn_latency),
+        "busy_frames": stats.busy_frames,
+        "rejected_turns": stats.rejected,
+        "errors": len(stats.errors),
+        "error_samples": stats.errors[:5],
+        "server_rss_kb": {
+            "start": stats.rss_samples[0],
+            "peak": max(stats.rss_samples),
+            "end": stats.rss_samples[-1],
+        } if stats.rss_samples else None,
+    }
+
+
+def compare(current, baseline):
+    """Print the change in the headline numbers against an earlier run."""
+    rows = [
+        ("connections_per_sec", lambda r: r.get("connections_per_sec")),
+        ("turns_per_sec", lambda r: r.get("turns_per_sec")),
+        ("ttft_p50_ms", lambda r: r["time_to_first_token"].get("p50_ms")),
+        ("ttft_p99_ms", lambda r: r["time_to_first_token"].get("p99_ms")),
+        ("turn_p50_ms", lambda r: r["turn_latency"].get("p50_ms")),
+        ("turn_p95_ms", lambda r: r["turn_latency"].get("p95_ms")),
+        ("turn_p99_ms", lambda r: r["turn_latency"].get("p99_ms")),
+        ("rss_peak_kb", lambda r: (r.get("server_rss_kb") or {}).get("peak")),
+    ]
+    print(f"{'metric':<22}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, get in rows:
+        old, new = get(baseline), get(current)
+        change = f"{(new - old) / old * 100:+.1f}%" if old and new is not None else "-"
+        print(f"{name:<22}{str(old):>12}{str(new):>12}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mental health chatbot client and WebSocket load generator")
+    parser.add_argument("--uri", default=DEFAULT_URI)
+    parser.add_argument("--interactive", action="store_true", help="chat from the terminal instead of running a load test")
+    parser.add_argument("--audio", action="store_true", help="with --interactive, send audio files instead of text")
+    parser.add_argument("--sessions", type=int, default=50, help="concurrent chat sessions")
+    parser.add_argument("--repeat", type=int, default=1, help="times each scripted conversation is replayed per session")
+    parser.add_argument("--script", help="JSON file with a list of conversations (lists of user messages)")
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds over which sessions are opened")
+    parser.add_argument("--think-time", type=float, default=0.0, help="pause between turns in seconds")
+    parser.add_argument("--turn-timeout", type=float, default=60.0)
+    parser.add_argument("--server-pid", type=int, help="uvicorn worker PID to sample RSS from")
+    parser.add_argument("--output", default="loadtest_results.json")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    if args.interactive:
+        asyncio.run(connect_mental_health_chatbot(args.uri, audio=args.audio))
+        return
+
+    results = asyncio.run(run_load(args))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"Results written to {os.path.abspath(args.output)}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
 
 if __name__ == "__main__":
-    asyncio.run(connect_mental_health_chatbot())
-    print("Client started. Look for 'You (in VSCode):' prompt.")
+    main()
@@ -0,0 +1,194 @@
+import os
+import re
+import math
+import unicodedata
+
+# Phrases that trigger the crisis fast path. Extend with CRISIS_PHRASES_FILE.
+DEFAULT_PHRASES = [
+    "suicide",
+    "suicidal",
+    "kill myself",
+    "killing myself",
+    "end my life",
+    "ending my life",
+    "take my own life",
+    "want to die",
+    "wanna die",
+    "wish i was dead",
+    "wish i were dead",
+    "better off dead",
+    "better off without me",
+    "no reason to live",
+    "nothing to live for",
+    "end it all",
+    "cant go on",
+    "dont want to live",
+    "dont want to be here anymore",
+    "hurt myself",
+    "hurting myself",
+    "harm myself",
+    "self harm",
+    "cut myself",
+    "cutting myself",
+    "overdose",
+]
+
+# Weights for the optional classifier: words that raise risk without being explicit
+RISK_WEIGHTS = {
+    "hopeless": 1.6,
+    "worthless": 1.4,
+    "burden": 1.3,
+    "trapped": 1.2,
+    "pointless": 1.1,
+    "goodbye": 1.0,
+    "pills": 1.0,
+    "die": 1.0,
+    "dead": 0.9,
+    "alone": 0.6,
+    "empty": 0.6,
+    "numb": 0.5,
+    "tired": 0.3,
+}
+
+CRISIS_RESOURCES = [
+    {"name": "National Suicide Prevention Lifeline", "contact": "988"},
+    {"name": "Crisis Text Line", "contact": "Text HOME to 741741"},
+    {"name": "Emergency Services", "contact": "911"},
+]
+
+CRISIS_MESSAGE = (
+    "It sounds like you're going through something really painful, and you don't have to face it alone. "
+    "If you are in danger or thinking about harming yourself, please reach out now: "
+    "call or text 988 (Suicide & Crisis Lifeline), text HOME to 741741, or call 911. "
+    "Your Critical Action Plan has your trusted contacts and the steps you wrote down for moments like this."
+)
+
+_APOSTROPHES = re.compile(r"['’`]")
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text):
+    """Casefold, strip accents and punctuation, and pad words with single spaces.
+
+    Padding lets the matcher treat " kill myself " as a whole-word match.
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c)).casefold()
+    text = _APOSTROPHES.sub("", text)
+    return " " + _NON_WORD.sub(" ", text).strip() + " "
+
+
+class PhraseMatcher:
+    """Aho-Corasick automaton over normalized phrases.
+
+    Matching is a single pass over the message, so its cost depends on the
+    message length and not on how many phrases are loaded.
+    """
+
+    def __init__(self, phrases):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [None]
+        for phrase in phrases:
+            normalized = normalize(phrase)
+            if normalized.strip():
+                self._add(normalized, phrase)
+        self._build()
+
+    def _add(self, pattern, phrase):
+        state = 0
+        for char in pattern:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(None)
+            state = next_state
+        self.output[state] = phrase
+
+    def _build(self):
+        # Breadth-first so every fail link points at an already finished state
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                if self.output[next_state] is None:
+                    self.output[next_state] = self.output[self.fail[next_state]]
+
+    def search(self, normalized):
+        """First phrase found in already normalized text, or None."""
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for char in normalized:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state] is not None:
+                return output[state]
+        return None
+
+
+class RiskClassifier:
+    """Tiny logistic model over keyword weights, for indirect signs of crisis."""
+
+    def __init__(self, weights=RISK_WEIGHTS, bias=-3.0, threshold=0.5):
+        self.weights = weights
+        self.bias = bias
+        self.threshold = threshold
+
+    def score(self, normalized):
+        total = self.bias + sum(self.weights.get(word, 0.0) for word in normalized.split())
+        return 1 / (1 + math.exp(-total))
+
+
+class CrisisDetector:
+    def __init__(self, phrases=DEFAULT_PHRASES, classifier=None):
+        self.matcher = PhraseMatcher(phrases)
+        self.classifier = classifier
+
+    def check(self, text):
+        """Return why ``text`` looks like a crisis, or None."""
+        normalized = normalize(text)
+        phrase = self.matcher.search(normalized)
+        if phrase is not None:
+            return {"reason": "phrase", "match": phrase}
+        if self.classifier is not None:
+            score = self.classifier.score(normalized)
+            if score >= self.classifier.threshold:
+                return {"reason": "classifier", "score": round(score, 3)}
+        return None
+
+
+def crisis_frame(detection):
+    return {
+        "type": "crisis",
+        "text": CRISIS_MESSAGE,
+        "resources": CRISIS_RESOURCES,
+        "actionPlan": "/critical-action-plan",
+        "reason": detection["reason"],
+    }
+
+
+def load_phrases(path):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def get_crisis_detector():
+    """Build the detector from CRISIS_PHRASES_FILE, CRISIS_CLASSIFIER and CRISIS_THRESHOLD."""
+    phrases = list(DEFAULT_PHRASES)
+    path = os.getenv("CRISIS_PHRASES_FILE")
+    if path:
+        phrases += load_phrases(path)
+
+    classifier = None
+    if os.getenv("CRISIS_CLASSIFIER", "0") == "1":
+        classifier = RiskClassifier(threshold=float(os.getenv("CRISIS_THRESHOLD", "0.5")))
+    return CrisisDetector(phrases, classifier)
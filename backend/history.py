@@ -0,0 +1,127 @@
+import os
+import asyncio
+import logging
+
+logger = logging.getLogger("chatbot.history")
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token) that needs no API call."""
+    return len(text) // 4 + 1
+
+
+def extractive_summary(summary, turns, max_chars=1200):
+    """Local fallback summarizer: keep the first sentence of each user turn."""
+    points = [summary] if summary else []
+    for turn in turns:
+        if turn["role"] != "user":
+            continue
+        first = turn["text"].split(". ")[0].strip()
+        if first:
+            points.append(f"User said: {first}")
+    text = " ".join(points)
+    # Keep the most recent points when the running summary gets too long
+    return text[-max_chars:]
+
+
+class ConversationHistory:
+    """Chat context capped by a token budget.
+
+    Recent turns are kept verbatim. When they exceed ``token_budget`` the
+    oldest turns are moved out and folded into a running summary by a
+    background task, so the reply in flight never waits on summarization.
+    """
+
+    def __init__(self, token_budget=None, summarizer=None):
+        self.token_budget = token_budget or int(os.getenv("HISTORY_TOKEN_BUDGET", "4000"))
+        self.summarizer = summarizer
+        self.turns = []
+        self.summary = ""
+        self.context_tokens = 0
+        self.pending = []
+        self.summary_task = None
+        # Cumulative usage for this session
+        self.prompt_tokens = 0
+        self.reply_tokens = 0
+        self.summarized_turns = 0
+
+    def add(self, role, text):
+        tokens = estimate_tokens(text)
+        self.turns.append({"role": role, "text": text, "tokens": tokens})
+        self.context_tokens += tokens
+
+    def contents(self):
+        """Context to send to the model: the summary, then the recent turns."""
+        contents = []
+        if self.summary:
+            contents.append({"role": "user", "parts": [f"Summary of our earlier conversation: {self.summary}"]})
+            contents.append({"role": "model", "parts": ["Thank you, I'll keep that in mind."]})
+        for turn in self.turns:
+            contents.append({"role": turn["role"], "parts": [turn["text"]]})
+        return contents
+
+    def record_usage(self, prompt_tokens, reply_tokens):
+        self.prompt_tokens += prompt_tokens
+        self.reply_tokens += reply_tokens
+
+    def compact(self):
+        """Move turns over the budget out of the context and summarize them in the background."""
+        # Evict whole user/model exchanges, always keeping the latest one
+        while self.context_tokens > self.token_budget and len(self.turns) > 2:
+            for turn in self.turns[:2]:
+                self.context_tokens -= turn["tokens"]
+                self.pending.append(turn)
+            del self.turns[:2]
+
+        if self.pending and (self.summary_task is None or self.summary_task.done()):
+            self.summary_task = asyncio.create_task(self._summarize())
+
+    async def _summarize(self):
+        while self.pending:
+            # Turns stay in ``pending`` until their summary is assigned, so a snapshot
+            # taken while the summarizer runs still contains them
+            turns = list(self.pending)
+            try:
+                if self.summarizer:
+                    summary = await self.summarizer(self.summary, turns)
+                else:
+                    summary = extractive_summary(self.summary, turns)
+            except Exception as e:
+                logger.warning("Summarization failed, using local summary: %s", type(e).__name__)
+                summary = extractive_summary(self.summary, turns)
+            self.summary = summary
+            del self.pending[:len(turns)]
+            self.summarized_turns += len(turns)
+
+    def to_state(self):
+        """JSON-serializable snapshot used by the session store."""
+        return {
+            # Copies: the store serializes the snapshot in a thread while the lists keep changing
+            "turns": list(self.turns),
+            "summary": self.summary,
+            # Turns still waiting for summarization are kept so nothing is lost
+            "pending": list(self.pending),
+            "prompt_tokens": self.prompt_tokens,
+            "reply_tokens": self.reply_tokens,
+            "summarized_turns": self.summarized_turns,
+        }
+
+    @classmethod
+    def from_state(cls, state, summarizer=None):
+        history = cls(summarizer=summarizer)
+        history.turns = state["turns"]
+        history.summary = state["summary"]
+        history.prompt_tokens = state["prompt_tokens"]
+        history.reply_tokens = state["reply_tokens"]
+        history.summarized_turns = state["summarized_turns"]
+        history.context_tokens = sum(turn["tokens"] for turn in history.turns)
+        history.pending = state["pending"]
+        return history
+
+    def usage(self):
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "reply_tokens": self.reply_tokens,
+            "context_tokens": self.context_tokens + (estimate_tokens(self.summary) if self.summary else 0),
+            "summarized_turns": self.summarized_turns,
+        }
@@ -0,0 +1,224 @@
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import bisect
+import random
+import logging
+import threading
+from collections import Counter
+from logging.handlers import QueueHandler, QueueListener
+
+# Fields that may hold what a user or the model said; logged as a length unless LOG_BODIES=1
+BODY_FIELDS = {"text", "reply", "transcript", "prompt"}
+
+# Upper bounds in seconds, from sub-millisecond socket work up to slow model replies
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, event and any structured fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Never blocks the caller: records that do not fit in the queue are counted and dropped."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread, so pass the record through untouched
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class EventLogger:
+    """Structured logging that stays off the event loop.
+
+    ``event`` only puts a record on a bounded queue; a listener thread formats
+    it as JSON and writes it out. Per-message events pass ``sampled=True`` and
+    are kept with probability ``sample_rate``. Body fields are replaced by
+    their length unless ``log_bodies`` is set.
+    """
+
+    def __init__(self, name="chatbot", level="INFO", sample_rate=1.0, log_bodies=False, queue_size=10000, stream=None):
+        self.sample_rate = sample_rate
+        self.log_bodies = log_bodies
+        self.logged = 0
+        self.sampled_out = 0
+
+        self.logger = logging.getLogger(name)
+        self.logger.setLevel(level)
+        self.logger.propagate = False
+        self.handler = DroppingQueueHandler(queue.Queue(queue_size))
+        self.logger.addHandler(self.handler)
+
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter())
+        self.listener = QueueListener(self.handler.queue, output)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    def event(self, event, level=logging.INFO, sampled=False, **fields):
+        if not self.logger.isEnabledFor(level):
+            return
+        if sampled and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return
+        if not self.log_bodies:
+            fields = redact(fields)
+        self.logged += 1
+        self.logger.log(level, event, extra={"fields": fields})
+
+    def stats(self):
+        return {
+            "logged": self.logged,
+            "sampled_out": self.sampled_out,
+            "dropped": self.handler.dropped,
+            "queued": self.handler.queue.qsize(),
+        }
+
+
+def redact(fields):
+    return {
+        key: f"<{len(value)} chars>" if key in BODY_FIELDS and isinstance(value, str) else value
+        for key, value in fields.items()
+    }
+
+
+def get_event_logger():
+    """Build the logger from LOG_LEVEL, LOG_SAMPLE_RATE, LOG_BODIES and LOG_QUEUE_SIZE."""
+    return EventLogger(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        sample_rate=float(os.getenv("LOG_SAMPLE_RATE", "0.1")),
+        log_bodies=os.getenv("LOG_BODIES", "0") == "1",
+        queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+    )
+
+
+class Histogram:
+    """Prometheus-style histogram of durations in seconds."""
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # One count per bucket plus the +Inf overflow
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        total = 0
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts):
+            total += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {total}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class Metrics:
+    """Registry rendered by /metrics in the Prometheus text format.
+
+    Histograms are updated directly on the hot path. Gauges and stats
+    collectors are callables, read only when the endpoint is scraped.
+    """
+
+    def __init__(self):
+        self.histograms = []
+        self.gauges = []
+        self.collectors = []
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        histogram = Histogram(name, help, buckets)
+        self.histograms.append(histogram)
+        return histogram
+
+    def gauge(self, name, help, read):
+        self.gauges.append((name, help, read))
+
+    def stats(self, prefix, read, counters=()):
+        """Expose every numeric value of a ``stats()`` dict as ``<prefix>_<key>``.
+
+        Keys listed in ``counters`` only ever grow and get the ``_total`` suffix;
+        the rest are gauges.
+        """
+        self.collectors.append((prefix, read, set(counters)))
+
+    def render(self):
+        lines = []
+        for histogram in self.histograms:
+            lines += histogram.render()
+        for name, help, read in self.gauges:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {read()}"]
+        for prefix, read, counters in self.collectors:
+            for key, value in read().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                if key in counters:
+                    lines += [f"# TYPE {prefix}_{key}_total counter", f"{prefix}_{key}_total {value}"]
+                else:
+                    lines += [f"# TYPE {prefix}_{key} gauge", f"{prefix}_{key} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """On-demand CPU profile of one thread, normally the one running the event loop.
+
+    A background thread reads the target thread's stack every ``interval``
+    seconds; nothing is hooked into the profiled code, so the overhead is only
+    paid while a capture runs. Output is in the collapsed-stack format read by
+    flamegraph.pl and speedscope: ``outer;inner;leaf count`` per line.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def capture(self, thread_id, seconds, interval=0.005):
+        """Blocks for ``seconds``; returns None if a capture is already running."""
+        if not self.lock.acquire(blocking=False):
+            return None
+        try:
+            stacks = Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                frame = sys._current_frames().get(thread_id)
+                if frame is None:
+                    break
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stacks[";".join(reversed(stack))] += 1
+                time.sleep(interval)
+            return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        finally:
+            self.lock.release()
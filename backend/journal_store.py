@@ -0,0 +1,424 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+from datetime import date, timedelta
+
+# Mean mood change between the last 7 days and the 7 before that which counts as a trend
+TREND_THRESHOLD = 0.3
+TREND_WINDOW = 7
+
+# Mood scale used by MoodTracker.js
+MOOD_MIN = 1
+MOOD_MAX = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal_entries (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    client_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created REAL NOT NULL,
+    sentiment REAL,
+    UNIQUE (user_id, client_id)
+);
+CREATE TABLE IF NOT EXISTS mood_entries (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    client_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    value REAL NOT NULL,
+    label TEXT,
+    note TEXT,
+    source TEXT NOT NULL,
+    created REAL NOT NULL,
+    UNIQUE (user_id, client_id)
+);
+CREATE TABLE IF NOT EXISTS daily_rollups (
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    journal_count INTEGER NOT NULL DEFAULT 0,
+    mood_count INTEGER NOT NULL DEFAULT 0,
+    mood_sum REAL NOT NULL DEFAULT 0,
+    sentiment_count INTEGER NOT NULL DEFAULT 0,
+    sentiment_sum REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id TEXT PRIMARY KEY,
+    journal_count INTEGER NOT NULL DEFAULT 0,
+    mood_count INTEGER NOT NULL DEFAULT 0,
+    first_day TEXT,
+    last_day TEXT,
+    streak INTEGER NOT NULL DEFAULT 0,
+    longest_streak INTEGER NOT NULL DEFAULT 0,
+    trend TEXT NOT NULL DEFAULT 'Stable',
+    version INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def classify_trend(recent, earlier, threshold=TREND_THRESHOLD):
+    """Improving/Stable/Declining from the mean daily mood of two windows."""
+    if not recent or not earlier:
+        return "Stable"
+    change = sum(recent) / len(recent) - sum(earlier) / len(earlier)
+    if change >= threshold:
+        return "Improving"
+    if change <= -threshold:
+        return "Declining"
+    return "Stable"
+
+
+class JournalStore:
+    """Append-only journal and mood store with incrementally maintained rollups.
+
+    Writes from all requests are queued and group-committed: one writer
+    task takes up to ``batch_size`` writes (or whatever arrived within
+    ``batch_delay`` seconds) and applies them in a single transaction.
+    Each insert also updates the per-day rollup row and the per-user
+    streak and trend, so reports never rescan entries.
+    """
+
+    def __init__(self, path, batch_size=256, batch_delay=0.005):
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.executescript(SCHEMA)
+        self.queue = None
+        self.writer = None
+        # Only the writer thread touches the connection for writes; reads take this lock too
+        self.lock = asyncio.Lock()
+        self.batches = 0
+        self.writes = 0
+        # Callbacks run with the user ids of every committed batch (cache invalidation)
+        self.listeners = []
+
+    # -- writes ------------------------------------------------------------
+
+    @staticmethod
+    def journal_item(user_id, content, day=None, client_id=None):
+        """Validated write for the queue; raises ValueError on bad input."""
+        return ("journal", user_id, {
+            "client_id": str(client_id) if client_id is not None else uuid.uuid4().hex,
+            "day": date.fromisoformat(day).isoformat() if day else date.today().isoformat(),
+            "content": content,
+        })
+
+    @staticmethod
+    def mood_item(user_id, value, day=None, client_id=None, label=None, note=None, source="mood"):
+        """Validated write for the queue; raises ValueError unless ``value`` is from 1 to 5."""
+        value = float(value)
+        if not MOOD_MIN <= value <= MOOD_MAX:
+            raise ValueError(f"Mood value must be between {MOOD_MIN} and {MOOD_MAX}, got {value}")
+        return ("mood", user_id, {
+            "client_id": str(client_id) if client_id is not None else uuid.uuid4().hex,
+            "day": date.fromisoformat(day).isoformat() if day else date.today().isoformat(),
+            "value": value,
+            "label": label,
+            "note": note,
+            "source": source,
+        })
+
+    @staticmethod
+    def sentiment_item(user_id, target, day, score, client_id=None):
+        """Score for a journal entry (``client_id``) or a chat message (``target`` "chat")."""
+        return ("sentiment", user_id, {
+            "target": target, "client_id": client_id, "day": day, "score": float(score),
+        })
+
+    async def add_mood(self, user_id, value, day=None, client_id=None, label=None, note=None, source="mood"):
+        return await self.add(self.mood_item(user_id, value, day, client_id, label, note, source))
+
+    async def add_many(self, items):
+        """Queue many writes at once (bulk import); returns 1/0 (new/duplicate) per item."""
+        return await asyncio.gather(*(self.add(item) for item in items))
+
+    async def add_sentiments(self, scores):
+        """Sink for the sentiment pipeline: (kind, user_id, day, client_id, score) tuples."""
+        await self.add_many([
+            self.sentiment_item(user_id, kind, day, score, client_id)
+            for kind, user_id, day, client_id, score in scores
+        ])
+
+    async def add(self, item):
+        """Queue one validated write and wait for its batch to commit; returns 1 if new."""
+        if self.writer is None or self.writer.done():
+            self.queue = asyncio.Queue()
+            self.writer = asyncio.create_task(self._write_loop())
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))
+        return await future
+
+    async def _write_loop(self):
+        while True:
+            batch = [await self.queue.get()]
+            deadline = time.monotonic() + self.batch_delay
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0 and self.queue.empty():
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), max(timeout, 0)))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                async with self.lock:
+                    results, user_ids = await asyncio.to_thread(self._commit, [item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for listener in self.listeners:
+                listener(user_ids)
+            for (_, future), inserted in zip(batch, results):
+                if not future.done():
+                    future.set_result(inserted)
+
+    def _commit(self, items):
+        """Apply one batch in a single transaction.
+
+        Returns 1/0 per item (new/duplicate) and the ids of users with new data.
+        """
+        results = []
+        touched = {}
+        scored = set()
+        now = time.time()
+        cur = self.conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            for kind, user_id, fields in items:
+                day, client_id = fields["day"], fields["client_id"]
+                if kind == "sentiment":
+                    results.append(self._add_sentiment(cur, user_id, fields))
+                    if results[-1]:
+                        scored.add(user_id)
+                    continue
+                if kind == "journal":
+                    cur.execute(
+                        "INSERT OR IGNORE INTO journal_entries (user_id, client_id, day, content, created) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (user_id, client_id, day, fields["content"], now),
+                    )
+                    rollup = (1, 0, 0.0)
+                else:
+                    cur.execute(
+                        "INSERT OR IGNORE INTO mood_entries "
+                        "(user_id, client_id, day, value, label, note, source, created) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (user_id, client_id, day, fields["value"], fields["label"],
+                         fields["note"], fields["source"], now),
+                    )
+                    rollup = (0, 1, fields["value"])
+
+                if cur.rowcount != 1:
+                    results.append(0)
+                    continue
+                cur.execute(
+                    "INSERT INTO daily_rollups (user_id, day, journal_count, mood_count, mood_sum) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT (user_id, day) DO UPDATE SET "
+                    "journal_count = journal_count + excluded.journal_count, "
+                    "mood_count = mood_count + excluded.mood_count, "
+                    "mood_sum = mood_sum + excluded.mood_sum",
+                    (user_id, day, *rollup),
+                )
+                counts = touched.setdefault(user_id, {"journal": 0, "mood": 0, "days": set()})
+                counts[kind] += 1
+                counts["days"].add(day)
+                results.append(1)
+
+            for user_id, counts in touched.items():
+                self._update_stats(cur, user_id, counts)
+            # New scores change reports too, so cached ones must be invalidated
+            for user_id in scored - touched.keys():
+                cur.execute("UPDATE user_stats SET version = version + 1 WHERE user_id = ?", (user_id,))
+            cur.execute("COMMIT")
+        except BaseException:
+            cur.execute("ROLLBACK")
+            raise
+        self.batches += 1
+        self.writes += len(items)
+        return results, list(touched.keys() | scored)
+
+    def _add_sentiment(self, cur, user_id, fields):
+        if fields["target"] == "journal":
+            # Each entry is scored once; a repeated score must not count twice in the rollup
+            cur.execute(
+                "UPDATE journal_entries SET sentiment = ? "
+                "WHERE user_id = ? AND client_id = ? AND sentiment IS NULL",
+                (fields["score"], user_id, fields["client_id"]),
+            )
+            if cur.rowcount != 1:
+                return 0
+        cur.execute(
+            "INSERT INTO daily_rollups (user_id, day, sentiment_count, sentiment_sum) "
+            "VALUES (?, ?, 1, ?) ON CONFLICT (user_id, day) DO UPDATE SET "
+            "sentiment_count = sentiment_count + 1, "
+            "sentiment_sum = sentiment_sum + excluded.sentiment_sum",
+            (user_id, fields["day"], fields["score"]),
+        )
+        return 1
+
+    def _update_stats(self, cur, user_id, counts):
+        row = cur.execute(
+            "SELECT journal_count, mood_count, first_day, last_day, streak, longest_streak, version "
+            "FROM user_stats WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        journal_count, mood_count, first_day, last_day, streak, longest, version = row or (0, 0, None, None, 0, 0, 0)
+
+        days = sorted(counts["days"])
+        if last_day is not None and days[0] < last_day:
+            # Backfilled days (e.g. an import): recount the streak from the rollups
+            streak, longest = self._recount_streaks(cur, user_id)
+            last_day = max(last_day, days[-1])
+        else:
+            for day in days:
+                if day == last_day:
+                    continue
+                if last_day and date.fromisoformat(day) - date.fromisoformat(last_day) == timedelta(days=1):
+                    streak += 1
+                else:
+                    streak = 1
+                last_day = day
+            longest = max(longest, streak)
+        first_day = min(first_day or days[0], days[0])
+
+        trend = classify_trend(*self._trend_windows(cur, user_id, last_day))
+        cur.execute(
+            "INSERT OR REPLACE INTO user_stats "
+            "(user_id, journal_count, mood_count, first_day, last_day, streak, longest_streak, trend, version) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (user_id, journal_count + counts["journal"], mood_count + counts["mood"],
+             first_day, last_day, streak, longest, trend, version + 1),
+        )
+
+    def _recount_streaks(self, cur, user_id):
+        streak = longest = 0
+        previous = None
+        for (day,) in cur.execute(
+            "SELECT day FROM daily_rollups WHERE user_id = ? AND journal_count + mood_count > 0 "
+            "ORDER BY day", (user_id,)
+        ):
+            current = date.fromisoformat(day)
+            streak = streak + 1 if previous and current - previous == timedelta(days=1) else 1
+            longest = max(longest, streak)
+            previous = current
+        return streak, longest
+
+    def _trend_windows(self, cur, user_id, last_day):
+        end = date.fromisoformat(last_day)
+        split = (end - timedelta(days=TREND_WINDOW - 1)).isoformat()
+        start = (end - timedelta(days=2 * TREND_WINDOW - 1)).isoformat()
+        recent, earlier = [], []
+        for day, mood_sum, mood_count in cur.execute(
+            "SELECT day, mood_sum, mood_count FROM daily_rollups "
+            "WHERE user_id = ? AND day >= ? AND day <= ? AND mood_count > 0",
+            (user_id, start, last_day),
+        ):
+            (recent if day >= split else earlier).append(mood_sum / mood_count)
+        return recent, earlier
+
+    # -- reads -------------------------------------------------------------
+
+    async def report(self, user_id, days=30):
+        async with self.lock:
+            return await asyncio.to_thread(self._report, user_id, days)
+
+    def _report(self, user_id, days):
+        stats = self.conn.execute(
+            "SELECT journal_count, mood_count, first_day, last_day, streak, longest_streak, trend "
+            "FROM user_stats WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if stats is None:
+            return None
+        journal_count, mood_count, first_day, last_day, streak, longest, trend = stats
+
+        # A streak only counts as current if the last entry was today or yesterday
+        if date.today() - date.fromisoformat(last_day) > timedelta(days=1):
+            streak = 0
+
+        since = (date.today() - timedelta(days=days - 1)).isoformat()
+        rows = self.conn.execute(
+            "SELECT day, journal_count, mood_count, mood_sum, sentiment_count, sentiment_sum "
+            "FROM daily_rollups WHERE user_id = ? AND day >= ? ORDER BY day", (user_id, since)
+        ).fetchall()
+        return {
+            "userId": user_id,
+            "journalCount": journal_count,
+            "moodCount": mood_count,
+            "firstEntry": first_day,
+            "lastActive": last_day,
+            "streak": streak,
+            "longestStreak": longest,
+            "moodTrend": trend,
+            "moodData": [
+                {"date": day, "value": round(mood_sum / moods, 2)}
+                for day, _, moods, mood_sum, _, _ in rows if moods
+            ],
+            "journalData": [
+                {"date": day, "count": journals} for day, journals, _, _, _, _ in rows if journals
+            ],
+            # Mean sentiment of the day's journal entries and chat messages, from -1 to 1
+            "sentimentData": [
+                {"date": day, "value": round(sentiment_sum / scores, 3)}
+                for day, _, _, _, scores, sentiment_sum in rows if scores
+            ],
+        }
+
+    async def journal(self, user_id, limit=50):
+        async with self.lock:
+            rows = await asyncio.to_thread(lambda: self.conn.execute(
+                "SELECT client_id, day, content FROM journal_entries "
+                "WHERE user_id = ? ORDER BY day DESC, id DESC LIMIT ?", (user_id, limit)
+            ).fetchall())
+        return [{"id": client_id, "isoDate": day, "content": content} for client_id, day, content in rows]
+
+
+def _parse_local_value(value, default):
+    # localStorage holds strings; accept both the raw strings and parsed JSON
+    if value is None:
+        return default
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return default
+    return value
+
+
+def items_from_local_storage(user_id, dump):
+    """Writes for a browser's localStorage dump (Journal.js and MoodTracker.js keys).
+
+    Streaks and last-entry dates are not imported: they are derived from the entries.
+    """
+    items = []
+    for entry in _parse_local_value(dump.get("journalEntries"), []):
+        if entry.get("content"):
+            items.append(JournalStore.journal_item(
+                user_id, entry["content"], entry.get("isoDate"), entry.get("id")
+            ))
+    for mood in _parse_local_value(dump.get("moods"), []):
+        if mood.get("value") is not None:
+            items.append(JournalStore.mood_item(
+                user_id, mood["value"], mood.get("dateISO"), mood.get("id"),
+                mood.get("label"), mood.get("note"),
+            ))
+    return items
+
+
+def get_journal_store():
+    """Build the store from JOURNAL_DB, JOURNAL_BATCH_SIZE and JOURNAL_BATCH_DELAY_MS."""
+    return JournalStore(
+        os.getenv("JOURNAL_DB", "journal.db"),
+        batch_size=int(os.getenv("JOURNAL_BATCH_SIZE", "256")),
+        batch_delay=float(os.getenv("JOURNAL_BATCH_DELAY_MS", "5")) / 1000,
+    )
@@ -1,18 +1,114 @@
 import os
 import json
+import time
+import base64
+import logging
+import threading
+from datetime import date
 import asyncio
+from contextlib import asynccontextmanager
+from typing import List, Optional, Union
 from dotenv import load_dotenv
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-import google.generativeai as genai
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, Field
+from providers import get_provider
+from sessions import get_session_store, new_session_id
+from crisis import get_crisis_detector, crisis_frame
+from journal_store import MOOD_MAX, MOOD_MIN, JournalStore, get_journal_store, items_from_local_storage
+from reports import ReportEngine
+from audio import AudioStream, AUDIO_CHUNK_BYTES, audio_metrics, get_transcriber
+from sentiment import get_sentiment_pipeline
+from instrumentation import Metrics, SamplingProfiler, get_event_logger
 
-# Load .env for GEMINI_API_KEY
+# Load .env for GOOGLE_API_KEY and LLM_PROVIDER
 load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-genai.configure(api_key=GOOGLE_API_KEY)
+# JSON logs written from a background thread; message bodies are redacted unless LOG_BODIES=1
+log = get_event_logger()
 
-app = FastAPI()
+# Gemini by default; LLM_PROVIDER=fake swaps in the local provider for load tests
+provider = get_provider()
+
+# Resumable chat sessions; SESSION_DB shares them between workers on this host
+session_store = get_session_store(provider)
+
+# Local crisis pre-filter, runs on every user message before the model is called
+crisis_detector = get_crisis_detector()
+
+# Journal and mood entries with per-user rollups (SQLite file set by JOURNAL_DB)
+journal_store = get_journal_store()
+
+# Cached batch reports for the clinician dashboard, invalidated by journal_store writes
+report_engine = ReportEngine(journal_store)
+
+# Off-loop sentiment scoring; scores are written back into journal_store rollups
+sentiment_pipeline = get_sentiment_pipeline(journal_store.add_sentiments)
+
+# Speech to text for audio sent over the socket; TRANSCRIBER picks the backend, None disables audio
+transcriber = get_transcriber()
+
+# Cap on concurrent model calls per worker; further turns wait in a bounded queue
+MAX_CONCURRENT_CHATS = int(os.getenv("MAX_CONCURRENT_CHATS", "8"))
+MAX_QUEUED_CHATS = int(os.getenv("MAX_QUEUED_CHATS", "32"))
+# Messages one socket may have waiting behind its current turn
+MAX_PENDING_TURNS = int(os.getenv("MAX_PENDING_TURNS", "4"))
+# A stalled model stream gives its slot back after this many seconds
+MODEL_TIMEOUT = float(os.getenv("MODEL_TIMEOUT_S", "60"))
+
+model_slots = asyncio.Semaphore(MAX_CONCURRENT_CHATS)
+queued_chats = 0
+model_calls = 0
+open_sockets = 0
+
+# Served by /metrics; PROFILING_ENABLED=1 turns on /debug/profile
+metrics = Metrics()
+receive_parse_seconds = metrics.histogram("chat_receive_parse_seconds", "Time from a frame arriving to it being parsed.")
+queue_wait_seconds = metrics.histogram("chat_queue_wait_seconds", "Time a turn waited for a model slot.")
+first_token_seconds = metrics.histogram("chat_model_first_token_seconds", "Time from the model call to its first text.")
+model_seconds = metrics.histogram("chat_model_seconds", "Total time of a model call.")
+send_seconds = metrics.histogram("chat_send_seconds", "Time to write one frame to the socket.")
+summary_seconds = metrics.histogram("chat_summary_seconds", "Total time of a history summary call.")
+metrics.gauge("chat_open_sockets", "Open WebSocket connections.", lambda: open_sockets)
+metrics.gauge("chat_model_calls_in_flight", "Model calls currently running.", lambda: model_calls)
+metrics.gauge("chat_queued_turns", "Turns waiting for a model slot.", lambda: queued_chats)
+metrics.stats("sessions", session_store.stats, counters=("hits", "disk_hits", "misses", "evictions", "expirations", "disk_expirations"))
+metrics.stats("audio", audio_metrics.stats, counters=("streams", "bytes_received", "chunks", "backpressure_waits"))
+metrics.stats("sentiment", sentiment_pipeline.stats, counters=("submitted", "scored", "dropped", "batches"))
+metrics.stats("reports_cache", report_engine.stats, counters=("hits", "misses"))
+metrics.stats("log", log.stats, counters=("logged", "sampled_out", "dropped"))
+
+async def summarize_in_slot(summary, turns, summarize=provider.summarize):
+    """History summaries are model calls too: they share the slots and timeout of chat turns."""
+    global model_calls
+
+    async with model_slots:
+        started = time.perf_counter()
+        model_calls += 1
+        try:
+            async with asyncio.timeout(MODEL_TIMEOUT):
+                return await summarize(summary, turns)
+        finally:
+            model_calls -= 1
+            summary_seconds.observe(time.perf_counter() - started)
+
+
+# Sessions are created after this, so every history picks up the capped summarizer
+if provider.summarize is not None:
+    provider.summarize = summarize_in_slot
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+profiler = SamplingProfiler()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Worker processes would otherwise outlive a reload or shutdown
+    sentiment_pipeline.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Allow CORS for localhost:3000
 app.add_middleware(
@@ -23,60 +119,419 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+async def send_json(websocket: WebSocket, payload):
+    start = time.perf_counter()
+    await websocket.send_text(json.dumps(payload))
+    send_seconds.observe(time.perf_counter() - start)
+
+
+async def stream_reply(websocket: WebSocket, chat_session, user_input: str, stream: bool):
+    """Run one model turn without blocking the event loop.
+
+    Partial text is relayed as it arrives when the client asked for streaming,
+    otherwise the full reply is sent as a single text frame. Either way the
+    turn ends with a turn_complete frame, after an error frame if the model
+    call failed.
+    """
+    global queued_chats, model_calls
+
+    if model_slots.locked():
+        if queued_chats >= MAX_QUEUED_CHATS:
+            await send_json(websocket, {
+                "type": "busy",
+                "queued": False,
+                "message": "Server is busy, please try again shortly."
+            })
+            return
+        await send_json(websocket, {
+            "type": "busy",
+            "queued": True,
+            "position": queued_chats + 1
+        })
+
+    queued_chats += 1
+    waited = time.perf_counter()
+    try:
+        await model_slots.acquire()
+    finally:
+        queued_chats -= 1
+    started = time.perf_counter()
+    queue_wait_seconds.observe(started - waited)
+
+    parts = []
+    first_token = None
+    failure = None
+    model_calls += 1
+    try:
+        async with asyncio.timeout(MODEL_TIMEOUT):
+            async for text in chat_session.stream(user_input):
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                    first_token_seconds.observe(first_token)
+                parts.append(text)
+                if stream:
+                    await send_json(websocket, {"type": "text", "text": text})
+    except WebSocketDisconnect:
+        raise
+    except Exception as e:
+        failure = e
+    finally:
+        model_calls -= 1
+        model_slots.release()
+    elapsed = time.perf_counter() - started
+    model_seconds.observe(elapsed)
+
+    if failure is not None:
+        # A provider, quota or timeout error ends this turn only; the socket and session stay usable
+        # Only the type and status: SDK exception reprs can include the model's text about the user
+        code = getattr(failure, "code", None)
+        log.event("model_error", logging.ERROR, model=round(elapsed, 4), error=type(failure).__name__,
+                  status=code if isinstance(code, int) else None)
+        await send_json(websocket, {
+            "type": "error",
+            "message": "The assistant could not reply just now. Please try again."
+        })
+        await send_json(websocket, {
+            "type": "turn_complete",
+            "usage": chat_session.history.usage()
+        })
+        return
+
+    bot_reply = "".join(parts).strip()
+    log.event("model_reply", sampled=True, queue_wait=round(started - waited, 4),
+              first_token=round(first_token, 4) if first_token is not None else None,
+              model=round(elapsed, 4), reply=bot_reply)
+
+    if not stream and bot_reply:
+        await send_json(websocket, {
+            "type": "text",
+            "text": bot_reply
+        })
+    await send_json(websocket, {
+        "type": "turn_complete",
+        "usage": chat_session.history.usage()
+    })
+
+
+class JournalEntry(BaseModel):
+    content: str = Field(min_length=1)
+    isoDate: Optional[str] = None
+    id: Optional[Union[int, str]] = None
+
+
+class MoodEntry(BaseModel):
+    value: float = Field(ge=MOOD_MIN, le=MOOD_MAX)
+    label: Optional[str] = None
+    note: Optional[str] = None
+    dateISO: Optional[str] = None
+    id: Optional[Union[int, str]] = None
+    source: str = "mood"
+
+
+def score_journal_entries(items):
+    for kind, user_id, fields in items:
+        if kind == "journal":
+            sentiment_pipeline.submit("journal", user_id, fields["day"], fields["content"], fields["client_id"])
+
+
+@app.post("/users/{user_id}/journal")
+async def add_journal_entry(user_id: str, entry: JournalEntry):
+    try:
+        item = JournalStore.journal_item(user_id, entry.content, entry.isoDate, entry.id)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    created = await journal_store.add(item)
+    if created:
+        score_journal_entries([item])
+    return {"created": bool(created)}
+
+
+@app.post("/users/{user_id}/moods")
+async def add_mood_entry(user_id: str, entry: MoodEntry):
+    try:
+        created = await journal_store.add_mood(
+            user_id, entry.value, entry.dateISO, entry.id, entry.label, entry.note, entry.source
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"created": bool(created)}
+
+
+@app.post("/users/{user_id}/import")
+async def import_local_storage(user_id: str, dump: dict):
+    """Import a browser's localStorage dump (journalEntries, moods) in one request."""
+    try:
+        items = items_from_local_storage(user_id, dump)
+    except (ValueError, TypeError, AttributeError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid localStorage dump: {e}")
+    results = await journal_store.add_many(items)
+    score_journal_entries([item for item, created in zip(items, results) if created])
+    return {"received": len(items), "imported": sum(results)}
+
+
+@app.get("/users/{user_id}/report")
+async def user_report(user_id: str, days: int = 30):
+    report = await journal_store.report(user_id, days)
+    if report is None:
+        raise HTTPException(status_code=404, detail="No entries for this user")
+    return report
+
+
+class BatchReportRequest(BaseModel):
+    patientIds: List[str] = Field(max_length=20000)
+    days: int = Field(default=30, ge=1, le=366)
+    points: int = Field(default=30, ge=1, le=366)
+
+
+@app.post("/reports/batch")
+async def batch_reports(body: BatchReportRequest, request: Request):
+    """Reports for a whole caseload; answers 304 when no patient has new data."""
+    patient_ids = list(dict.fromkeys(body.patientIds))
+    stats = await report_engine.patient_stats(patient_ids)
+    etag = report_engine.etag(patient_ids, stats, body.days, body.points)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    result = await report_engine.batch(patient_ids, body.days, body.points, stats)
+    return JSONResponse(result, headers=headers)
+
+
+@app.get("/users/{user_id}/journal")
+async def user_journal(user_id: str, limit: int = 50):
+    return await journal_store.journal(user_id, limit)
+
+
+@app.get("/sessions/stats")
+async def session_stats():
+    return session_store.stats()
+
+
+async def open_session(websocket: WebSocket, session_id=None):
+    """Resume ``session_id`` from the store, or start a new session if it is unknown."""
+    chat_session = await session_store.get(session_id) if session_id else None
+    resumed = chat_session is not None
+    if not resumed:
+        session_id = new_session_id()
+        chat_session = provider.start_chat()
+
+    await send_json(websocket, {
+        "type": "session",
+        "sessionId": session_id,
+        "resumed": resumed,
+        "turns": len(chat_session.history.turns) // 2
+    })
+    return session_id, chat_session
+
+
+@app.get("/sentiment/stats")
+async def sentiment_stats():
+    return sentiment_pipeline.stats()
+
+
+@app.get("/audio/stats")
+async def audio_stats():
+    return audio_metrics.stats()
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/debug/profile")
+async def cpu_profile(seconds: float = 10, interval_ms: float = 5):
+    """Sample the event loop thread's stacks for ``seconds``; collapsed-stack text for flame graphs."""
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled; set PROFILING_ENABLED=1")
+    loop_thread = threading.get_ident()
+    log.event("profile_started", seconds=seconds)
+    profile = await asyncio.to_thread(
+        profiler.capture, loop_thread, min(max(seconds, 0.1), 60), max(interval_ms, 1) / 1000
+    )
+    if profile is None:
+        raise HTTPException(status_code=409, detail="A profile is already being captured")
+    return PlainTextResponse(profile)
+
+
 @app.websocket("/ws/webclient")
 async def websocket_endpoint(websocket: WebSocket):
+    global open_sockets
+
     await websocket.accept()
-    print("✅ WebSocket connection accepted.")
-
-    # Initialize Gemini model with safety settings
-    model = genai.GenerativeModel(
-        model_name="gemini-2.0-flash",
-        safety_settings=[
-            {"category": "HARM_CATEGORY_DANGEROUS", "threshold": "BLOCK_NONE"},
-            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_LOW_AND_ABOVE"},
-        ]
-    )
+    open_sockets += 1
+    log.event("ws_connected")
+
+    session_id = None
+    chat_session = None
+    stream = False
+    audio_stream = None
+    user_id = None
+
+    # Model turns run one at a time in their own task, so the receive loop keeps
+    # reading (and crisis-checking) while a reply is still streaming
+    pending_turns = asyncio.Queue()
+
+    async def handle_user_text(user_input):
+        # Crisis resources go out immediately, even if the model is slow or down
+        detection = crisis_detector.check(user_input)
+        if detection:
+            log.event("crisis_detected", logging.WARNING, session=session_id, reason=detection["reason"])
+            await send_json(websocket, crisis_frame(detection))
+
+        if pending_turns.qsize() >= MAX_PENDING_TURNS:
+            await send_json(websocket, {
+                "type": "busy",
+                "queued": False,
+                "message": "Please wait for the current reply before sending more messages."
+            })
+            return
+        pending_turns.put_nowait(user_input)
+
+    async def run_turns():
+        nonlocal session_id, chat_session
+        while True:
+            user_input = await pending_turns.get()
+            try:
+                if chat_session is None:
+                    session_id, chat_session = await open_session(websocket)
+                # A config message may switch sessions while this turn runs
+                turn_session_id, turn_session = session_id, chat_session
+
+                # Scored in the background; never delays the reply. Anonymous chats have no report to land in
+                if user_id:
+                    sentiment_pipeline.submit("chat", user_id, date.today().isoformat(), user_input)
+
+                await stream_reply(websocket, turn_session, user_input, stream)
+                await session_store.put(turn_session_id, turn_session)
+            except Exception as e:
+                # Usually the socket closed mid-turn; the receive loop sees that too
+                log.event("turn_error", logging.ERROR, session=session_id, error=type(e).__name__)
 
-    chat_session = model.start_chat(history=[])
-    system_prompt = ""
+    turn_runner = asyncio.create_task(run_turns())
+
+    async def audio_failed(audio, error, message="Could not transcribe the audio. Please try again."):
+        # Like a failed model call, a failed transcription ends this utterance only
+        if audio is not None:
+            audio.abort()
+        log.event("transcription_error", logging.ERROR, session=session_id, error=type(error).__name__)
+        await send_json(websocket, {
+            "type": "error",
+            "message": message
+        })
+
+    async def finish_audio(audio):
+        try:
+            transcript = (await audio.finish()).strip()
+        except Exception as e:
+            await audio_failed(audio, e)
+            return
+        log.event("transcript", sampled=True, session=session_id, transcript=transcript)
+        await send_json(websocket, {
+            "type": "transcript",
+            "text": transcript
+        })
+        if transcript:
+            await handle_user_text(transcript)
 
     try:
         while True:
-            print("🔁 Waiting for message from client...")
-            data = await websocket.receive_text()
-            print(f"📩 Received raw data: {data}")
+            frame = await websocket.receive()
+            received = time.perf_counter()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
 
-            message = json.loads(data)
-            print(f"📦 Parsed message: {message}")
+            # Binary frames carry audio for the stream opened by audio_start
+            if frame.get("bytes") is not None:
+                chunk = frame["bytes"]
+                if audio_stream is None or len(chunk) > AUDIO_CHUNK_BYTES:
+                    await send_json(websocket, {
+                        "type": "error",
+                        "message": "Send audio_start first, then binary chunks of at most "
+                                   f"{AUDIO_CHUNK_BYTES} bytes."
+                    })
+                    continue
+                try:
+                    await audio_stream.write(chunk)
+                except Exception as e:
+                    await audio_failed(audio_stream, e)
+                    audio_stream = None
+                continue
+
+            message = json.loads(frame["text"])
+            receive_parse_seconds.observe(time.perf_counter() - received)
+            log.event("message_received", sampled=True, session=session_id, kind=message.get("type"))
 
             if message["type"] == "config":
-                system_prompt = message["config"]["systemPrompt"]
-                print(f"⚙️ System prompt received: {system_prompt}")
-                
-                # ❌ FIX HERE — remove 'await'
-                chat_session.send_message(system_prompt)
+                # A reconnecting client sends back the sessionId it was given
+                session_id, chat_session = await open_session(websocket, message["config"].get("sessionId"))
+                # Applied as the model's system instruction, not sent as a chat turn
+                chat_session.system_prompt = message["config"]["systemPrompt"]
+                await session_store.put(session_id, chat_session)
+                # Clients that render partial text opt in to incremental frames
+                stream = bool(message["config"].get("stream", False))
+                # Chat sentiment is only recorded for clients that identify the user
+                user_id = message["config"].get("userId")
+                log.event("config", session=session_id, stream=stream, prompt=chat_session.system_prompt)
                 continue
 
             if message["type"] == "text":
-                user_input = message["data"]
-                print(f"👤 User input: {user_input}")
+                await handle_user_text(message["data"])
+                continue
 
-                # ❗ DO NOT AWAIT THIS — it's synchronous
-                response = chat_session.send_message(user_input)
-                bot_reply = response.text.strip()
-                print(f"🤖 Gemini response: {bot_reply}")
+            if message["type"] in ("audio_start", "audio") and transcriber is None:
+                await send_json(websocket, {
+                    "type": "error",
+                    "message": "Voice messages are not available on this server. Please type your message."
+                })
+                continue
+
+            if message["type"] == "audio_start":
+                if chat_session is None and message.get("sessionId"):
+                    session_id, chat_session = await open_session(websocket, message["sessionId"])
+                if audio_stream is not None:
+                    audio_stream.abort()
+                    audio_stream = None
+                try:
+                    sample_rate = int(message.get("sampleRate", 16000))
+                except (TypeError, ValueError) as e:
+                    await audio_failed(None, e, "sampleRate must be a whole number of samples per second.")
+                    continue
+                try:
+                    audio_stream = AudioStream(transcriber.start(message.get("format", "pcm16"), sample_rate))
+                except Exception as e:
+                    await audio_failed(None, e)
+                continue
+
+            if message["type"] == "audio_end" and audio_stream is not None:
+                audio, audio_stream = audio_stream, None
+                await finish_audio(audio)
+                continue
 
-                await websocket.send_text(json.dumps({
-                    "type": "text",
-                    "text": bot_reply
-                }))
-                print("📤 Sent response to frontend.")
+            if message["type"] == "audio":
+                # Older clients send the whole file base64-encoded in one frame
+                audio = None
+                try:
+                    payload = memoryview(base64.b64decode(message["data"]))
+                    audio = AudioStream(transcriber.start(message.get("format", "pcm16"), 16000))
+                    for offset in range(0, len(payload), AUDIO_CHUNK_BYTES):
+                        await audio.write(payload[offset:offset + AUDIO_CHUNK_BYTES])
+                except Exception as e:
+                    await audio_failed(audio, e)
+                    continue
+                await finish_audio(audio)
 
     except WebSocketDisconnect:
-        print("⚠️ Client disconnected.")
+        log.event("ws_disconnected", session=session_id,
+                  usage=chat_session.history.usage() if chat_session is not None else None)
     except Exception as e:
-        print(f"❌ Exception occurred: {e}")
-        await websocket.send_text(json.dumps({
+        log.event("ws_error", logging.ERROR, session=session_id, error=type(e).__name__)
+        await send_json(websocket, {
             "type": "error",
             "message": str(e)
-        }))
+        })
+    finally:
+        open_sockets -= 1
+        turn_runner.cancel()
+        if audio_stream is not None:
+            audio_stream.abort()
@@ -0,0 +1,173 @@
+import os
+import asyncio
+from collections import OrderedDict
+from history import ConversationHistory, estimate_tokens
+
+SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_DANGEROUS", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_LOW_AND_ABOVE"},
+]
+
+SUMMARY_PROMPT = (
+    "You summarize a supportive mental health conversation for the assistant's own memory. "
+    "Keep the user's feelings, concerns, names and anything they asked to remember. "
+    "Reply with at most five short sentences and nothing else."
+)
+
+
+class ChatSession:
+    """One conversation: the system prompt plus a token-capped history.
+
+    ``stream(text)`` is an async iterator yielding the reply as text chunks,
+    so the endpoint never depends on a specific SDK.
+    """
+
+    def __init__(self, provider, system_prompt="", history=None):
+        self.provider = provider
+        self.system_prompt = system_prompt
+        self.history = history or ConversationHistory(summarizer=provider.summarize)
+
+    async def stream(self, text):
+        self.history.add("user", text)
+        contents = self.history.contents()
+        usage = {}
+        parts = []
+        try:
+            async for chunk in self.provider.generate(self.system_prompt, contents, usage):
+                parts.append(chunk)
+                yield chunk
+        except BaseException:
+            # Keep user/model turns paired when a call fails or is cancelled
+            self.history.turns.pop()
+            self.history.context_tokens -= estimate_tokens(text)
+            raise
+
+        reply = "".join(parts)
+        self.history.add("model", reply)
+        # Providers that report real usage override the local estimate
+        self.history.record_usage(
+            usage.get("prompt_tokens") or estimate_tokens(self.system_prompt)
+            + sum(estimate_tokens(c["parts"][0]) for c in contents),
+            usage.get("reply_tokens") or estimate_tokens(reply),
+        )
+        self.history.compact()
+
+    def to_state(self):
+        return {"system_prompt": self.system_prompt, "history": self.history.to_state()}
+
+
+class ChatProvider:
+    """Creates chat sessions for the WebSocket endpoint."""
+
+    name = "base"
+    # Async callable (summary, turns) -> summary; None uses the local extractive summary
+    summarize = None
+
+    def start_chat(self, system_prompt=""):
+        return ChatSession(self, system_prompt)
+
+    def restore_chat(self, state):
+        """Rebuild a chat session from ``ChatSession.to_state()`` without calling the model."""
+        history = ConversationHistory.from_state(state["history"], summarizer=self.summarize)
+        chat_session = ChatSession(self, state["system_prompt"], history)
+        history.compact()
+        return chat_session
+
+    def generate(self, system_prompt, contents, usage):
+        """Async iterator over the reply to ``contents``; fills in ``usage`` if known."""
+        raise NotImplementedError
+
+
+class GeminiProvider(ChatProvider):
+    name = "gemini"
+
+    def __init__(self, api_key=None, model_name="gemini-2.0-flash", max_models=8):
+        # Imported here so the fake provider runs without the SDK or an API key
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.genai = genai
+        self.model_name = model_name
+        # Process-wide LRU of models keyed by (system prompt, safety settings); clients
+        # choose the prompt, so it is bounded
+        self.models = OrderedDict()
+        self.max_models = max_models
+
+    def get_model(self, system_prompt, safety_settings=SAFETY_SETTINGS):
+        key = (system_prompt, tuple((s["category"], s["threshold"]) for s in safety_settings))
+        model = self.models.get(key)
+        if model is not None:
+            self.models.move_to_end(key)
+            return model
+        model = self.genai.GenerativeModel(
+            model_name=self.model_name,
+            safety_settings=safety_settings,
+            system_instruction=system_prompt or None,
+        )
+        self.models[key] = model
+        while len(self.models) > self.max_models:
+            self.models.popitem(last=False)
+        return model
+
+    async def generate(self, system_prompt, contents, usage):
+        model = self.get_model(system_prompt)
+        response = await model.generate_content_async(contents, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+        metadata = getattr(response, "usage_metadata", None)
+        if metadata:
+            usage["prompt_tokens"] = metadata.prompt_token_count
+            usage["reply_tokens"] = metadata.candidates_token_count
+
+    async def summarize(self, summary, turns):
+        model = self.get_model(SUMMARY_PROMPT)
+        transcript = "\n".join(f"{t['role']}: {t['text']}" for t in turns)
+        response = await model.generate_content_async(
+            f"Previous summary: {summary or '(none)'}\n\nNew turns:\n{transcript}"
+        )
+        return response.text.strip()
+
+
+class FakeProvider(ChatProvider):
+    """Local stand-in for load tests: no network, no quota.
+
+    ``latency`` is the delay before the first token in seconds and
+    ``tokens_per_sec`` the rate at which the remaining tokens arrive.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency=0.2, tokens_per_sec=50.0, reply_tokens=40):
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.reply_tokens = reply_tokens
+
+    async def generate(self, system_prompt, contents, usage):
+        await asyncio.sleep(self.latency)
+
+        # Deterministic reply: same context gives the same tokens
+        words = contents[-1]["parts"][0].split() or ["..."]
+        delay = 1.0 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0
+        for i in range(self.reply_tokens):
+            if i and delay:
+                await asyncio.sleep(delay)
+            yield words[(i + len(contents)) % len(words)] + " "
+
+
+def get_provider():
+    """Build the provider selected by the LLM_PROVIDER environment variable."""
+    name = os.getenv("LLM_PROVIDER", "gemini").lower()
+    if name == "fake":
+        return FakeProvider(
+            latency=float(os.getenv("FAKE_LATENCY_MS", "200")) / 1000,
+            tokens_per_sec=float(os.getenv("FAKE_TOKENS_PER_SEC", "50")),
+            reply_tokens=int(os.getenv("FAKE_REPLY_TOKENS", "40")),
+        )
+    if name == "gemini":
+        return GeminiProvider(
+            api_key=os.getenv("GOOGLE_API_KEY"),
+            max_models=int(os.getenv("GEMINI_MAX_MODELS", "8")),
+        )
+    raise ValueError(f"Unknown LLM_PROVIDER: {name}")
@@ -0,0 +1,259 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+
+from journal_store import TREND_THRESHOLD, TREND_WINDOW
+
+# SQLite limits bound parameters per statement; stay well below it
+CHUNK = 500
+
+
+def _chunks(items, size=CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _buckets(days, points):
+    """Start and end day offsets of the chart buckets."""
+    edges = np.unique(np.linspace(0, days, points + 1).astype(np.intp)[:-1])
+    return edges, np.append(edges[1:], days) - 1
+
+
+def _to_lists(matrix):
+    """Rows as lists rounded to 2 places, with NaN (no data) as None for JSON."""
+    values = np.round(matrix, 2).astype(object)
+    values[np.isnan(matrix)] = None
+    return values.tolist()
+
+
+class ReportEngine:
+    """Batch reports for a clinician's whole caseload.
+
+    Rollups for every patient that is not cached are loaded in one pass and
+    laid out as (patient x day) NumPy arrays, so trends, rolling averages and
+    downsampled chart series are computed column-wise rather than per row.
+    Results are cached per (patient, window) and dropped when the journal
+    store commits new data for that patient.
+    """
+
+    def __init__(self, store, max_entries=50000):
+        self.store = store
+        self.max_entries = max_entries
+        # (patient, days, points, end day) -> (version, report)
+        self.cache = OrderedDict()
+        self.keys_by_patient = {}
+        self.hits = 0
+        self.misses = 0
+        store.listeners.append(self.invalidate)
+
+    def invalidate(self, patient_ids):
+        for patient_id in patient_ids:
+            for key in self.keys_by_patient.pop(patient_id, ()):
+                self.cache.pop(key, None)
+
+    async def patient_stats(self, patient_ids):
+        """patient -> (version, last_day, journal_total, streak) for patients with data."""
+        async with self.store.lock:
+            return await asyncio.to_thread(self._patient_stats, patient_ids)
+
+    def _patient_stats(self, patient_ids):
+        stats = {}
+        for chunk in _chunks(patient_ids):
+            marks = ",".join("?" * len(chunk))
+            for row in self.store.conn.execute(
+                "SELECT user_id, version, last_day, journal_count, streak FROM user_stats "
+                f"WHERE user_id IN ({marks})", chunk
+            ):
+                stats[row[0]] = row[1:]
+        return stats
+
+    @staticmethod
+    def etag(patient_ids, stats, days, points):
+        """Changes only when a patient logs data, the request changes or the day rolls over."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{date.today()}|{days}|{points}".encode())
+        for patient_id in patient_ids:
+            version = stats.get(patient_id, (0,))[0]
+            digest.update(f"|{patient_id}:{version}".encode())
+        return f'"{digest.hexdigest()}"'
+
+    async def batch(self, patient_ids, days=30, points=30, stats=None):
+        if stats is None:
+            stats = await self.patient_stats(patient_ids)
+        end = date.today()
+        points = max(1, min(points, days))
+
+        reports = {}
+        missing = []
+        for patient_id in patient_ids:
+            if patient_id not in stats:
+                reports[patient_id] = None
+                continue
+            entry = self.cache.get((patient_id, days, points, end))
+            if entry is not None and entry[0] == stats[patient_id][0]:
+                self.cache.move_to_end((patient_id, days, points, end))
+                reports[patient_id] = entry[1]
+                self.hits += 1
+            else:
+                missing.append(patient_id)
+
+        if missing:
+            self.misses += len(missing)
+            async with self.store.lock:
+                computed = await asyncio.to_thread(self._compute, missing, stats, days, points, end)
+            for patient_id, report in computed.items():
+                self._remember((patient_id, days, points, end), stats[patient_id][0], report)
+                reports[patient_id] = report
+
+        start = end - timedelta(days=days - 1)
+        edges, bucket_ends = _buckets(days, points)
+        return {
+            "window": {
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "days": days,
+                "points": points,
+                # Chart x axis shared by every patient: bucket start and end dates
+                "seriesDates": [(start + timedelta(days=int(i))).isoformat() for i in edges],
+                "rollingDates": [(start + timedelta(days=int(i))).isoformat() for i in bucket_ends],
+            },
+            "patients": reports,
+        }
+
+    def _remember(self, key, version, report):
+        self.cache[key] = (version, report)
+        self.keys_by_patient.setdefault(key[0], set()).add(key)
+        while len(self.cache) > self.max_entries:
+            old_key, _ = self.cache.popitem(last=False)
+            keys = self.keys_by_patient.get(old_key[0])
+            if keys:
+                keys.discard(old_key)
+
+    def _load_rollups(self, patient_ids, start, end):
+        """Rollup columns: patient index, then day offset, journals, moods, mood sum,
+        sentiment count and sentiment sum."""
+        rows = []
+        for chunk in _chunks(patient_ids):
+            marks = ",".join("?" * len(chunk))
+            rows += self.store.conn.execute(
+                "SELECT user_id, CAST(julianday(day) - julianday(?) AS INTEGER), "
+                "journal_count, mood_count, mood_sum, sentiment_count, sentiment_sum FROM daily_rollups "
+                f"WHERE user_id IN ({marks}) AND day >= ? AND day <= ?",
+                (start.isoformat(), *chunk, start.isoformat(), end.isoformat()),
+            ).fetchall()
+        if not rows:
+            return np.zeros(0, dtype=np.intp), np.zeros((0, 6))
+
+        user_ids, *values = zip(*rows)
+        # Map user ids to row indexes with a sorted lookup instead of a Python dict loop
+        ids = np.array(patient_ids)
+        order = np.argsort(ids)
+        index = order[np.searchsorted(ids, np.array(user_ids), sorter=order)]
+        return index, np.array(values, dtype=np.float64).T
+
+    def _trends(self, patient_ids):
+        """Same rule as ``classify_trend`` in the journal store, for many patients at once.
+
+        Mean of the daily mood means over the `TREND_WINDOW` days ending at each
+        patient's last active day, against the `TREND_WINDOW` days before that.
+        """
+        rows = []
+        for chunk in _chunks(patient_ids):
+            marks = ",".join("?" * len(chunk))
+            rows += self.store.conn.execute(
+                "SELECT r.user_id, CAST(julianday(s.last_day) - julianday(r.day) AS INTEGER), "
+                "r.mood_sum / r.mood_count FROM daily_rollups r JOIN user_stats s ON s.user_id = r.user_id "
+                f"WHERE r.user_id IN ({marks}) AND r.mood_count > 0 "
+                "AND r.day <= s.last_day AND r.day > date(s.last_day, ?)",
+                (*chunk, f"-{2 * TREND_WINDOW} days"),
+            ).fetchall()
+        if not rows:
+            return np.full(len(patient_ids), "Stable", dtype=object)
+
+        user_ids, age, daily_mean = zip(*rows)
+        ids = np.array(patient_ids)
+        order = np.argsort(ids)
+        index = order[np.searchsorted(ids, np.array(user_ids), sorter=order)]
+        # Slot 2i holds patient i's recent window, 2i + 1 the window before it
+        slot = 2 * index + (np.array(age) >= TREND_WINDOW)
+        size = 2 * len(patient_ids)
+        sums = np.bincount(slot, np.array(daily_mean), minlength=size).reshape(-1, 2)
+        counts = np.bincount(slot, minlength=size).reshape(-1, 2)
+        means = np.divide(sums, counts, out=np.full(sums.shape, np.nan), where=counts > 0)
+        change = means[:, 0] - means[:, 1]
+        return np.select(
+            [change >= TREND_THRESHOLD, change <= -TREND_THRESHOLD], ["Improving", "Declining"], "Stable"
+        )
+
+    def _compute(self, patient_ids, stats, days, points, end):
+        start = end - timedelta(days=days - 1)
+        rows, columns = self._load_rollups(patient_ids, start, end)
+        shape = (len(patient_ids), days)
+        journals = np.zeros(shape)
+        moods = np.zeros(shape)
+        mood_sums = np.zeros(shape)
+        if len(rows):
+            cols = columns[:, 0].astype(np.intp)
+            journals[rows, cols] = columns[:, 1]
+            moods[rows, cols] = columns[:, 2]
+            mood_sums[rows, cols] = columns[:, 3]
+        # Only window totals are needed for sentiment, so sum straight from the columns
+        scores = np.bincount(rows, columns[:, 4], minlength=len(patient_ids))
+        score_sums = np.bincount(rows, columns[:, 5], minlength=len(patient_ids))
+
+        def mean(sums, counts):
+            return np.divide(sums, counts, out=np.full(sums.shape, np.nan), where=counts > 0)
+
+        trends = self._trends(patient_ids).tolist()
+
+        # Rolling mean mood over TREND_WINDOW days, from prefix sums along the day axis
+        padded_sums = np.pad(np.cumsum(mood_sums, 1), ((0, 0), (TREND_WINDOW, 0)))
+        padded_moods = np.pad(np.cumsum(moods, 1), ((0, 0), (TREND_WINDOW, 0)))
+        rolling = mean(
+            padded_sums[:, TREND_WINDOW:] - padded_sums[:, :-TREND_WINDOW],
+            padded_moods[:, TREND_WINDOW:] - padded_moods[:, :-TREND_WINDOW],
+        )
+        average = mean(mood_sums.sum(1), moods.sum(1))
+        journal_counts = journals.sum(1).astype(np.int64)
+
+        # Downsample to `points` buckets for the chart
+        edges, bucket_ends = _buckets(days, points)
+        series = mean(np.add.reduceat(mood_sums, edges, axis=1), np.add.reduceat(moods, edges, axis=1))
+        series = _to_lists(series)
+        rolling_series = _to_lists(rolling[:, bucket_ends])
+        latest_rolling = _to_lists(rolling[:, -1])
+        average = _to_lists(average)
+        sentiment = _to_lists(mean(score_sums, scores))
+        journal_counts = journal_counts.tolist()
+
+        yesterday = (end - timedelta(days=1)).isoformat()
+        reports = {}
+        for i, patient_id in enumerate(patient_ids):
+            _, last_day, journal_total, streak = stats[patient_id]
+            reports[patient_id] = {
+                "moodTrend": trends[i],
+                "moodAverage": average[i],
+                "rollingAverage": latest_rolling[i],
+                "sentimentAverage": sentiment[i],
+                "journalCount": journal_counts[i],
+                "journalTotal": journal_total,
+                "lastActive": last_day,
+                # A streak only counts as current if the last entry was today or yesterday
+                "streak": streak if last_day >= yesterday else 0,
+                # Aligned with the window's seriesDates / rollingDates; null where no mood was logged
+                "moodSeries": series[i],
+                "rollingSeries": rolling_series[i],
+            }
+        return reports
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
@@ -0,0 +1,166 @@
+import os
+import re
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger("chatbot.sentiment")
+
+# Word valences from -3 (very negative) to 3 (very positive)
+LEXICON = {
+    "happy": 2.7, "glad": 2.0, "joy": 2.8, "joyful": 2.9, "great": 3.0, "good": 1.9,
+    "better": 1.9, "calm": 1.3, "relaxed": 2.0, "peaceful": 2.2, "grateful": 2.7,
+    "thankful": 2.5, "hopeful": 2.3, "proud": 2.1, "excited": 2.2, "love": 3.0,
+    "loved": 2.9, "enjoy": 2.2, "enjoyed": 2.3, "fun": 2.3, "okay": 0.9, "fine": 0.8,
+    "rested": 1.5, "safe": 1.9, "strong": 1.6, "confident": 2.2, "motivated": 1.9,
+    "supported": 2.0, "content": 1.5, "well": 1.1, "nice": 1.8, "friend": 2.2,
+    "friends": 2.1, "laugh": 2.6, "smile": 2.2, "progress": 1.5, "improving": 1.8,
+    "sad": -2.1, "unhappy": -1.8, "depressed": -2.3, "down": -1.1, "lonely": -2.0,
+    "alone": -1.0, "anxious": -1.8, "anxiety": -1.9, "worried": -1.9, "worry": -1.8,
+    "stressed": -2.0, "stress": -1.8, "overwhelmed": -2.1, "tired": -1.3,
+    "exhausted": -1.9, "angry": -2.3, "upset": -1.9, "afraid": -2.0, "scared": -2.2,
+    "panic": -2.3, "hopeless": -2.9, "worthless": -2.9, "empty": -1.7, "numb": -1.4,
+    "hurt": -2.4, "pain": -2.3, "cry": -2.1, "crying": -2.1, "terrible": -2.5,
+    "awful": -2.5, "bad": -2.5, "worse": -2.1, "worst": -3.0, "hate": -2.7,
+    "guilty": -1.8, "ashamed": -2.1, "burden": -1.9, "failure": -2.3, "sick": -1.8,
+    "insomnia": -1.6, "trapped": -2.2, "miserable": -2.7, "struggling": -1.8,
+}
+NEGATIONS = {"not", "no", "never", "dont", "cant", "isnt", "wasnt", "without", "nothing", "didnt"}
+INTENSIFIERS = {"very": 1.3, "really": 1.3, "so": 1.2, "extremely": 1.5, "too": 1.2, "slightly": 0.7}
+
+_WORD = re.compile(r"[a-z]+")
+
+
+def score_text(text):
+    """Compound sentiment in [-1, 1] from the lexicon, with negation and intensifiers."""
+    words = _WORD.findall(text.lower().replace("'", ""))
+    total = 0.0
+    negate_for = 0
+    boost = 1.0
+    for word in words:
+        if word in NEGATIONS:
+            negate_for = 3
+            continue
+        if word in INTENSIFIERS:
+            boost = INTENSIFIERS[word]
+            continue
+        valence = LEXICON.get(word)
+        if valence is not None:
+            valence *= boost
+            if negate_for:
+                valence *= -0.74
+            total += valence
+        boost = 1.0
+        negate_for = max(0, negate_for - 1)
+    return round(total / (total * total + 15) ** 0.5, 4)
+
+
+def score_texts(texts):
+    """Score a batch; runs in a worker process."""
+    return [score_text(text) for text in texts]
+
+
+class SentimentPipeline:
+    """Background sentiment scoring for chat messages and journal entries.
+
+    ``submit`` only puts the text on a queue and never waits; when the queue
+    is full the item is dropped and counted. A batcher takes up to
+    ``batch_size`` items, or whatever arrived within ``max_delay`` seconds,
+    scores them in a process pool and hands the scores to ``sink``.
+    """
+
+    def __init__(self, sink, batch_size=64, max_delay=0.05, pool_size=2, queue_size=10000):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.pool_size = pool_size
+        self.queue_size = queue_size
+        self.queue = None
+        self.batcher = None
+        self.pool = None
+        # Batches being scored; holding them here keeps the tasks from being garbage collected
+        self.tasks = set()
+        # Keeps at most one batch per worker process in flight
+        self.slots = asyncio.Semaphore(pool_size)
+        self.submitted = 0
+        self.scored = 0
+        self.dropped = 0
+        self.batches = 0
+
+    def submit(self, kind, user_id, day, text, ref=None):
+        """Queue ``text`` for scoring; ``kind`` is "journal" or "chat"."""
+        if self.batcher is None or self.batcher.done():
+            self.queue = asyncio.Queue(self.queue_size)
+            self.batcher = asyncio.create_task(self._batch_loop())
+        try:
+            self.queue.put_nowait((kind, user_id, day, text, ref))
+            self.submitted += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _batch_loop(self):
+        while True:
+            batch = [await self.queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self.slots.acquire()
+            task = asyncio.create_task(self._score(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _score(self, batch):
+        try:
+            if self.pool is None:
+                # Forking a process that already runs threads (log listener, executors) is unsafe
+                self.pool = ProcessPoolExecutor(self.pool_size, mp_context=multiprocessing.get_context("spawn"))
+            loop = asyncio.get_running_loop()
+            scores = await loop.run_in_executor(self.pool, score_texts, [item[3] for item in batch])
+            self.batches += 1
+            self.scored += len(batch)
+            await self.sink([
+                (kind, user_id, day, ref, score)
+                for (kind, user_id, day, _, ref), score in zip(batch, scores)
+            ])
+        except Exception:
+            logger.exception("Sentiment batch failed")
+        finally:
+            self.slots.release()
+
+    def stats(self):
+        return {
+            "submitted": self.submitted,
+            "scored": self.scored,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "queued": self.queue.qsize() if self.queue else 0,
+        }
+
+    def close(self):
+        """Stop batching and shut down the worker processes; queued items are dropped."""
+        if self.batcher is not None:
+            self.batcher.cancel()
+        for task in self.tasks:
+            task.cancel()
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+
+def get_sentiment_pipeline(sink):
+    """Build the pipeline from SENTIMENT_BATCH_SIZE, SENTIMENT_MAX_DELAY_MS and SENTIMENT_POOL_SIZE."""
+    return SentimentPipeline(
+        sink,
+        batch_size=int(os.getenv("SENTIMENT_BATCH_SIZE", "64")),
+        max_delay=float(os.getenv("SENTIMENT_MAX_DELAY_MS", "50")) / 1000,
+        pool_size=int(os.getenv("SENTIMENT_POOL_SIZE", "2")),
+        queue_size=int(os.getenv("SENTIMENT_QUEUE_SIZE", "10000")),
+    )
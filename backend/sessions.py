@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+def session_size(chat_session):
+    """Approximate memory of a session: the characters of its prompt, summary and turns."""
+    history = chat_session.history
+    size = len(chat_session.system_prompt) + len(history.summary)
+    size += sum(len(turn["text"]) for turn in (*history.turns, *history.pending))
+    return size
+
+
+class SQLiteSessionBackend:
+    """Session snapshots in a SQLite file (WAL mode) shared by all workers on a host."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated)")
+
+    def get(self, session_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT state, updated FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None, None
+        return json.loads(row[0]), row[1]
+
+    def updated(self, session_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT updated FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, session_id, state, updated):
+        payload = json.dumps(state)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, state, updated) VALUES (?, ?, ?)",
+                (session_id, payload, updated),
+            )
+
+    def expire(self, older_than):
+        with self.lock:
+            return self.conn.execute(
+                "DELETE FROM sessions WHERE updated < ?", (older_than,)
+            ).rowcount
+
+
+class SessionStore:
+    """Chat sessions by ID: a bounded in-memory LRU with idle-TTL eviction.
+
+    With a backend, every save is also written through to it so sessions
+    survive LRU eviction and can be resumed by any worker. SQLite calls run
+    in a thread so the event loop is never blocked on disk.
+    """
+
+    def __init__(self, provider, max_sessions=1000, idle_ttl=1800, backend=None, expire_interval=60):
+        self.provider = provider
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.backend = backend
+        # Seconds between sweeps of idle sessions out of the backend
+        self.expire_interval = min(expire_interval, idle_ttl)
+        self.disk_expired_at = time.time()
+        # session_id -> (chat_session, last_used); least recently used first
+        self.sessions = OrderedDict()
+        # Size estimate per resident session, updated as sessions are saved or dropped
+        self.sizes = {}
+        self.resident_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.disk_expirations = 0
+        if backend is not None:
+            self.disk_expirations += backend.expire(time.time() - idle_ttl)
+
+    def expire_idle(self, now=None):
+        """Drop sessions idle for longer than ``idle_ttl`` (oldest are at the front)."""
+        now = now or time.time()
+        while self.sessions:
+            session_id, (_, last_used) = next(iter(self.sessions.items()))
+            if now - last_used <= self.idle_ttl:
+                break
+            del self.sessions[session_id]
+            self._forget(session_id)
+            self.expirations += 1
+
+    async def get(self, session_id):
+        self.expire_idle()
+        entry = self.sessions.get(session_id)
+        if entry is not None:
+            chat_session, last_used = entry
+            # Another worker may have continued this session since we cached it
+            if self.backend is None or (await asyncio.to_thread(self.backend.updated, session_id) or 0) <= last_used:
+                self.sessions.move_to_end(session_id)
+                self.hits += 1
+                return chat_session
+
+        if self.backend is not None:
+            state, updated = await asyncio.to_thread(self.backend.get, session_id)
+            if state is not None and time.time() - updated <= self.idle_ttl:
+                chat_session = self.provider.restore_chat(state)
+                self._remember(session_id, chat_session, updated)
+                self.disk_hits += 1
+                return chat_session
+
+        self.misses += 1
+        return None
+
+    async def put(self, session_id, chat_session):
+        now = time.time()
+        self._remember(session_id, chat_session, now)
+        if self.backend is not None:
+            await asyncio.to_thread(self.backend.put, session_id, chat_session.to_state(), now)
+            if now - self.disk_expired_at >= self.expire_interval:
+                # Conversation text must not outlive the idle TTL on disk either
+                self.disk_expired_at = now
+                self.disk_expirations += await asyncio.to_thread(self.backend.expire, now - self.idle_ttl)
+
+    def _remember(self, session_id, chat_session, last_used):
+        self.sessions[session_id] = (chat_session, last_used)
+        self.sessions.move_to_end(session_id)
+        self._forget(session_id)
+        self.sizes[session_id] = session_size(chat_session)
+        self.resident_bytes += self.sizes[session_id]
+        self.expire_idle()
+        while len(self.sessions) > self.max_sessions:
+            evicted, _ = self.sessions.popitem(last=False)
+            self._forget(evicted)
+            self.evictions += 1
+
+    def _forget(self, session_id):
+        self.resident_bytes -= self.sizes.pop(session_id, 0)
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "resident_sessions": len(self.sessions),
+            "max_sessions": self.max_sessions,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "disk_expirations": self.disk_expirations,
+            "bytes_per_session": round(self.resident_bytes / len(self.sessions)) if self.sessions else 0,
+            "resident_bytes": self.resident_bytes,
+            "backend": self.backend.path if self.backend else None,
+        }
+
+
+def get_session_store(provider):
+    """Build the session store from SESSION_MAX, SESSION_IDLE_TTL, SESSION_DB and SESSION_EXPIRE_INTERVAL."""
+    path = os.getenv("SESSION_DB")
+    return SessionStore(
+        provider,
+        max_sessions=int(os.getenv("SESSION_MAX", "1000")),
+        idle_ttl=float(os.getenv("SESSION_IDLE_TTL", "1800")),
+        backend=SQLiteSessionBackend(path) if path else None,
+        expire_interval=float(os.getenv("SESSION_EXPIRE_INTERVAL", "60")),
+    )
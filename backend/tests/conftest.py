@@ -0,0 +1,31 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# main.py builds its stores and provider at import time, so configure them first
+_tmp = tempfile.mkdtemp()
+os.environ.update({
+    "LLM_PROVIDER": "fake",
+    "FAKE_LATENCY_MS": "0",
+    "FAKE_TOKENS_PER_SEC": "0",
+    "JOURNAL_DB": os.path.join(_tmp, "journal.db"),
+    "JOURNAL_BATCH_DELAY_MS": "0",
+    "SENTIMENT_POOL_SIZE": "1",
+    "LOG_SAMPLE_RATE": "0",
+    "TRANSCRIBER": "fake",
+})
+os.environ.pop("SESSION_DB", None)
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
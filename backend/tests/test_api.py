@@ -0,0 +1,141 @@
+import json
+from datetime import date, timedelta
+
+
+def days_ago(n):
+    return (date.today() - timedelta(days=n)).isoformat()
+
+
+def test_import_is_idempotent_and_builds_the_report(client):
+    dump = {
+        "journalEntries": json.dumps([
+            {"id": 1, "content": "Slept well", "isoDate": days_ago(1)},
+            {"id": 2, "content": "Long day", "isoDate": days_ago(0)},
+        ]),
+        "moods": json.dumps([{"id": 3, "value": 4, "label": "Happy", "dateISO": days_ago(0)}]),
+    }
+    assert client.post("/users/import-a/import", json=dump).json() == {"received": 3, "imported": 3}
+    assert client.post("/users/import-a/import", json=dump).json() == {"received": 3, "imported": 0}
+
+    report = client.get("/users/import-a/report").json()
+    assert (report["journalCount"], report["moodCount"], report["streak"]) == (2, 1, 2)
+    assert report["moodData"] == [{"date": days_ago(0), "value": 4.0}]
+
+
+def test_import_rejects_moods_outside_the_scale(client):
+    dump = {"moods": [{"id": 1, "value": 99, "dateISO": days_ago(0)}]}
+    assert client.post("/users/import-b/import", json=dump).status_code == 422
+    assert client.post("/users/import-b/moods", json={"value": 99}).status_code == 422
+    assert client.get("/users/import-b/report").status_code == 404
+
+
+def test_import_rejects_malformed_dump(client):
+    assert client.post("/users/import-c/import", json={"journalEntries": [{"content": "x", "isoDate": "soon"}]}).status_code == 422
+
+
+def chat_until_complete(ws, text):
+    ws.send_text(json.dumps({"type": "text", "data": text}))
+    frames = []
+    while not frames or frames[-1]["type"] != "turn_complete":
+        frames.append(ws.receive_json())
+    return [frame["type"] for frame in frames]
+
+
+def test_failed_model_call_keeps_the_socket_open(client, monkeypatch):
+    import main
+
+    async def failing(system_prompt, contents, usage):
+        raise RuntimeError("quota exceeded")
+        yield
+
+    with client.websocket_connect("/ws/webclient") as ws:
+        ws.send_text(json.dumps({"type": "config", "config": {"systemPrompt": "Be kind."}}))
+        assert ws.receive_json()["type"] == "session"
+
+        with monkeypatch.context() as patch:
+            patch.setattr(main.provider, "generate", failing)
+            assert chat_until_complete(ws, "Hello") == ["error", "turn_complete"]
+
+        assert chat_until_complete(ws, "Hello again") == ["text", "turn_complete"]
+
+
+def test_chat_sentiment_needs_a_user_id(client):
+    import main
+
+    for config, expected in (({}, 0), ({"userId": "chat-a"}, 1)):
+        submitted = main.sentiment_pipeline.submitted
+        with client.websocket_connect("/ws/webclient") as ws:
+            ws.send_text(json.dumps({"type": "config", "config": {"systemPrompt": "Be kind.", **config}}))
+            ws.receive_json()
+            chat_until_complete(ws, "I feel a bit better today")
+        assert main.sentiment_pipeline.submitted - submitted == expected
+
+
+def test_stalled_model_call_times_out_and_frees_its_slot(client, monkeypatch):
+    import asyncio
+
+    import main
+
+    async def stalled(system_prompt, contents, usage):
+        yield "partial "
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(main, "MODEL_TIMEOUT", 0.1)
+    with client.websocket_connect("/ws/webclient") as ws:
+        ws.send_text(json.dumps({"type": "config", "config": {"systemPrompt": "Be kind."}}))
+        ws.receive_json()
+        with monkeypatch.context() as patch:
+            patch.setattr(main.provider, "generate", stalled)
+            assert chat_until_complete(ws, "Hello") == ["error", "turn_complete"]
+        assert main.model_calls == 0
+        assert not main.model_slots.locked()
+        assert chat_until_complete(ws, "Hello again") == ["text", "turn_complete"]
+
+
+def test_summary_calls_share_the_model_slots_and_timeout(client, monkeypatch):
+    import asyncio
+
+    import pytest
+
+    import main
+
+    calls = []
+
+    async def summarize(summary, turns):
+        calls.append(main.model_calls)
+        return "summary"
+
+    async def stalled(summary, turns):
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(main, "MODEL_TIMEOUT", 0.1)
+    timed = main.summary_seconds.count
+    assert client.portal.call(main.summarize_in_slot, "", [], summarize) == "summary"
+    assert calls == [1]
+    with pytest.raises(TimeoutError):
+        client.portal.call(main.summarize_in_slot, "", [], stalled)
+    assert main.summary_seconds.count - timed == 2
+    assert main.model_calls == 0
+    assert not main.model_slots.locked()
+
+
+def test_crisis_frame_does_not_wait_for_a_running_turn(client, monkeypatch):
+    import time
+
+    import main
+
+    monkeypatch.setattr(main.provider, "latency", 1.0)
+    with client.websocket_connect("/ws/webclient") as ws:
+        started = time.perf_counter()
+        ws.send_text(json.dumps({"type": "text", "data": "hello"}))
+        ws.send_text(json.dumps({"type": "text", "data": "I want to kill myself"}))
+        frames = []
+        while [frame["type"] for frame in frames].count("turn_complete") < 2:
+            frames.append(ws.receive_json())
+            if frames[-1]["type"] == "crisis":
+                crisis_after = time.perf_counter() - started
+
+    kinds = [frame["type"] for frame in frames]
+    assert kinds.index("crisis") < kinds.index("turn_complete")
+    assert crisis_after < 0.5
+    assert kinds.count("text") == 2
@@ -0,0 +1,163 @@
+import asyncio
+
+import pytest
+
+from audio import AudioMetrics, AudioStream, FakeTranscriber, RingBuffer
+
+
+def test_ring_buffer_wraps_around():
+    ring = RingBuffer(8)
+    assert ring.write(b"abcdef") == 6
+    assert ring.read(4) == b"abcd"
+    # Wraps past the end of the backing array
+    assert ring.write(b"ghijklmn") == 6
+    assert ring.free() == 0
+    assert ring.read(100) == b"efghijkl"
+    assert ring.size == 0
+    assert ring.write(b"xyz") == 3
+    assert ring.read(3) == b"xyz"
+
+
+def test_ring_buffer_matches_a_plain_queue():
+    ring = RingBuffer(7)
+    expected = bytearray()
+    for step in range(200):
+        if step % 3:
+            data = bytes([step % 256]) * (step % 5 + 1)
+            written = ring.write(data)
+            expected += data[:written]
+        else:
+            count = step % 6
+            assert ring.read(count) == bytes(expected[:count])
+            del expected[:count]
+        assert ring.size == len(expected) <= 7
+
+
+class SlowTranscription:
+    def __init__(self):
+        self.received = bytearray()
+        self.release = asyncio.Event()
+
+    async def process(self, frame):
+        await self.release.wait()
+        self.received += frame
+
+    async def result(self):
+        return bytes(self.received)
+
+
+def test_stream_waits_for_the_transcriber_when_full():
+    async def run():
+        metrics = AudioMetrics()
+        transcription = SlowTranscription()
+        stream = AudioStream(transcription, capacity=16, frame_bytes=4, metrics=metrics)
+        audio = bytes(range(64))
+
+        writer = asyncio.create_task(stream.write(audio))
+        await asyncio.sleep(0.05)
+        # Blocked: the buffer is full and the transcriber has not taken more than one frame
+        assert not writer.done()
+        assert metrics.peak_bytes_buffered <= 16
+        assert metrics.backpressure_waits >= 1
+
+        transcription.release.set()
+        await writer
+        assert await stream.finish() == audio
+        assert metrics.bytes_buffered == 0
+        assert metrics.active_streams == 0
+
+    asyncio.run(run())
+
+
+def test_transcriber_error_reaches_a_blocked_writer():
+    class Failing:
+        async def process(self, frame):
+            raise RuntimeError("model crashed")
+
+        async def result(self):
+            return ""
+
+    async def run():
+        stream = AudioStream(Failing(), capacity=8, frame_bytes=4, metrics=AudioMetrics())
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(stream.write(bytes(64)), 5)
+        stream.abort()
+
+    asyncio.run(run())
+
+
+def test_fake_transcriber_returns_its_transcript():
+    async def run():
+        stream = AudioStream(FakeTranscriber("hello").start("pcm16", 16000), metrics=AudioMetrics())
+        await stream.write(bytes(1000))
+        return await stream.finish()
+
+    assert asyncio.run(run()) == "hello"
+
+
+def test_binary_audio_over_the_socket(client):
+    import json
+
+    with client.websocket_connect("/ws/webclient") as ws:
+        ws.send_text(json.dumps({"type": "audio_start", "format": "pcm16", "sampleRate": 16000}))
+        for _ in range(4):
+            ws.send_bytes(bytes(8000))
+        ws.send_text(json.dumps({"type": "audio_end"}))
+        frames = [ws.receive_json()]
+        while frames[-1]["type"] != "turn_complete":
+            frames.append(ws.receive_json())
+    assert [frame["type"] for frame in frames] == ["transcript", "session", "text", "turn_complete"]
+
+
+class FailingTranscriber:
+    def start(self, audio_format, sample_rate):
+        class Transcription:
+            async def process(self, frame):
+                raise RuntimeError("transcriber crashed")
+
+            async def result(self):
+                return ""
+
+        return Transcription()
+
+
+def receive_until(ws, kind):
+    frames = [ws.receive_json()]
+    while frames[-1]["type"] != kind:
+        frames.append(ws.receive_json())
+    return [frame["type"] for frame in frames]
+
+
+def test_failed_transcription_keeps_the_socket_open(client, monkeypatch):
+    import json
+
+    import main
+
+    monkeypatch.setattr(main, "transcriber", FailingTranscriber())
+    with client.websocket_connect("/ws/webclient") as ws:
+        ws.send_text(json.dumps({"type": "audio_start", "sampleRate": "fast"}))
+        assert ws.receive_json()["type"] == "error"
+
+        ws.send_text(json.dumps({"type": "audio_start"}))
+        ws.send_bytes(bytes(1000))
+        ws.send_text(json.dumps({"type": "audio_end"}))
+        assert receive_until(ws, "error") == ["error"]
+
+        ws.send_text(json.dumps({"type": "audio", "data": "bm90IGF1ZGlv"}))
+        assert receive_until(ws, "error") == ["error"]
+
+        ws.send_text(json.dumps({"type": "text", "data": "Still there?"}))
+        assert receive_until(ws, "turn_complete") == ["session", "text", "turn_complete"]
+
+
+def test_audio_is_rejected_without_a_transcriber(client, monkeypatch):
+    import json
+
+    import main
+
+    monkeypatch.setattr(main, "transcriber", None)
+    with client.websocket_connect("/ws/webclient") as ws:
+        for message in ({"type": "audio_start"}, {"type": "audio", "data": ""}):
+            ws.send_text(json.dumps(message))
+            frame = ws.receive_json()
+            assert frame["type"] == "error" and "not available" in frame["message"]
@@ -0,0 +1,44 @@
+import random
+
+from crisis import CrisisDetector, PhraseMatcher, RiskClassifier, normalize
+
+
+def test_normalize_ignores_case_accents_and_punctuation():
+    assert normalize("I DON'T want to   live!!") == " i dont want to live "
+    assert normalize("Café—naïve") == " cafe naive "
+
+
+def test_matches_whole_words_only():
+    matcher = PhraseMatcher(["kill myself"])
+    assert matcher.search(normalize("I want to KILL myself.")) == "kill myself"
+    assert matcher.search(normalize("I'll skill myself up")) is None
+    assert matcher.search(normalize("kill myselfie")) is None
+
+
+def test_fail_links_find_phrases_inside_partial_matches():
+    # " a b c " is a partial match of the first phrase; the second starts inside it
+    matcher = PhraseMatcher(["a b c d", "b c e"])
+    assert matcher.search(normalize("a b c e")) == "b c e"
+    assert matcher.search(normalize("a b c d")) == "a b c d"
+    # A shorter phrase ending inside a longer one is reported through the fail link output
+    assert PhraseMatcher(["end it all now", "it all"]).search(normalize("end it all later")) == "it all"
+
+
+def test_agrees_with_substring_search():
+    rng = random.Random(5)
+    words = ["end", "it", "all", "end it", "no", "point", "no point", "i", "want"]
+    for _ in range(200):
+        phrases = rng.sample(words, 3)
+        matcher = PhraseMatcher(phrases)
+        text = normalize(" ".join(rng.choices(words, k=rng.randint(0, 8))))
+        expected = {phrase for phrase in phrases if normalize(phrase) in text}
+        found = matcher.search(text)
+        assert (found is not None) == bool(expected)
+        assert found is None or found in expected
+
+
+def test_detector_reasons():
+    detector = CrisisDetector(phrases=["want to die"], classifier=RiskClassifier(threshold=0.5))
+    assert detector.check("Sometimes I WANT to die")["reason"] == "phrase"
+    assert detector.check("I feel hopeless, worthless, like a burden")["reason"] == "classifier"
+    assert detector.check("I had a nice walk today") is None
@@ -0,0 +1,107 @@
+import asyncio
+
+from history import ConversationHistory, estimate_tokens, extractive_summary
+
+
+def exchange(history, n, size=40):
+    history.add("user", f"user message {n}. " + "x" * size)
+    history.add("model", f"model reply {n}. " + "y" * size)
+    history.compact()
+
+
+def test_snapshot_during_summary_keeps_every_turn():
+    async def run():
+        release = asyncio.Event()
+
+        async def slow_summarizer(summary, turns):
+            await release.wait()
+            return f"{summary} summarized {len(turns)}".strip()
+
+        history = ConversationHistory(token_budget=30, summarizer=slow_summarizer)
+        snapshots = []
+        for n in range(4):
+            exchange(history, n)
+            await asyncio.sleep(0)
+            snapshots.append(history.to_state())
+
+        release.set()
+        await history.summary_task
+        return history, snapshots
+
+    history, snapshots = asyncio.run(run())
+    for n, state in enumerate(snapshots):
+        kept = [turn["text"] for turn in state["pending"] + state["turns"]]
+        # Nothing is summarized yet, so every exchange so far is in the snapshot
+        assert len(kept) == 2 * (n + 1)
+        restored = ConversationHistory.from_state(state)
+        assert restored.turns == state["turns"]
+    assert history.pending == []
+    assert history.summarized_turns == 6
+    assert history.context_tokens == sum(estimate_tokens(turn["text"]) for turn in history.turns)
+
+
+def test_compact_evicts_whole_exchanges_and_keeps_the_latest():
+    async def run():
+        history = ConversationHistory(token_budget=20)
+        for n in range(3):
+            exchange(history, n)
+        await history.summary_task
+        return history
+
+    history = asyncio.run(run())
+    assert [turn["role"] for turn in history.turns] == ["user", "model"]
+    assert history.turns[0]["text"].startswith("user message 2.")
+    # Over budget on its own, the latest exchange is still kept
+    assert history.context_tokens > history.token_budget
+    assert history.summary == "User said: user message 0 User said: user message 1"
+    assert history.summarized_turns == 4
+
+
+def test_contents_start_with_the_summary():
+    history = ConversationHistory()
+    history.add("user", "hello")
+    assert history.contents() == [{"role": "user", "parts": ["hello"]}]
+
+    history.summary = "User said: I had a rough week"
+    contents = history.contents()
+    assert [c["role"] for c in contents] == ["user", "model", "user"]
+    assert contents[0]["parts"][0].endswith("I had a rough week")
+    assert contents[-1] == {"role": "user", "parts": ["hello"]}
+
+
+def test_failed_summarizer_falls_back_to_extractive_summary():
+    async def failing_summarizer(summary, turns):
+        raise RuntimeError("quota exceeded")
+
+    async def run():
+        history = ConversationHistory(token_budget=30, summarizer=failing_summarizer)
+        exchange(history, 0)
+        exchange(history, 1)
+        evicted = list(history.pending)
+        await history.summary_task
+        return history, evicted
+
+    history, evicted = asyncio.run(run())
+    assert history.summary == extractive_summary("", evicted)
+    assert history.pending == []
+    assert history.summarized_turns == 2
+
+
+def test_usage_counts():
+    async def run():
+        history = ConversationHistory(token_budget=30)
+        exchange(history, 0)
+        history.record_usage(100, 20)
+        exchange(history, 1)
+        history.record_usage(150, 25)
+        await history.summary_task
+        return history
+
+    history = asyncio.run(run())
+    assert history.usage() == {
+        "prompt_tokens": 250,
+        "reply_tokens": 45,
+        "context_tokens": history.context_tokens + estimate_tokens(history.summary),
+        "summarized_turns": 2,
+    }
+    assert history.context_tokens == sum(turn["tokens"] for turn in history.turns)
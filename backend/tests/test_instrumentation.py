@@ -0,0 +1,91 @@
+import atexit
+import io
+import json
+import logging
+
+from instrumentation import EventLogger, Metrics, redact
+
+
+def stop(log):
+    """Flush and stop the listener thread, which would otherwise be stopped again at exit."""
+    log.listener.stop()
+    atexit.unregister(log.listener.stop)
+
+
+def lines(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_redact_replaces_bodies_with_their_length():
+    fields = redact({"text": "I feel awful", "reply": "", "kind": "text", "prompt": None, "chars": 3})
+    assert fields == {"text": "<12 chars>", "reply": "<0 chars>", "kind": "text", "prompt": None, "chars": 3}
+
+
+def test_event_logger_redacts_and_samples():
+    stream = io.StringIO()
+    log = EventLogger(name="test.redact", sample_rate=0, stream=stream)
+    log.event("message_received", sampled=True, text="secret")
+    log.event("model_reply", text="secret", session="s1")
+    log.event("debug_only", logging.DEBUG, text="secret")
+    stop(log)
+
+    assert lines(stream) == [
+        {"ts": lines(stream)[0]["ts"], "level": "info", "logger": "test.redact",
+         "event": "model_reply", "text": "<6 chars>", "session": "s1"},
+    ]
+    assert log.stats() == {"logged": 1, "sampled_out": 1, "dropped": 0, "queued": 0}
+
+
+def test_event_logger_can_log_bodies():
+    stream = io.StringIO()
+    log = EventLogger(name="test.bodies", log_bodies=True, stream=stream)
+    log.event("model_reply", reply="hello")
+    stop(log)
+    assert lines(stream)[0]["reply"] == "hello"
+
+
+def test_event_logger_drops_instead_of_blocking():
+    stream = io.StringIO()
+    log = EventLogger(name="test.drop", queue_size=1, stream=stream)
+    stop(log)
+    for _ in range(3):
+        log.event("ws_connected")
+    assert log.stats()["dropped"] == 2
+
+
+def test_metrics_render():
+    metrics = Metrics()
+    histogram = metrics.histogram("chat_send_seconds", "Send time.", buckets=(0.01, 0.1, 1))
+    for seconds in (0.005, 0.01, 0.05, 2):
+        histogram.observe(seconds)
+    metrics.gauge("chat_open_sockets", "Open sockets.", lambda: 3)
+    metrics.stats("sessions", lambda: {"hits": 5, "hit_rate": 0.5, "backend": None, "name": "x", "flag": True},
+                  counters=("hits",))
+
+    text = metrics.render()
+    assert text.endswith("\n")
+    output = text.splitlines()
+    # Bucket counts are cumulative; le="0.01" includes the value exactly on the bound
+    assert output[:8] == [
+        "# HELP chat_send_seconds Send time.",
+        "# TYPE chat_send_seconds histogram",
+        'chat_send_seconds_bucket{le="0.01"} 2',
+        'chat_send_seconds_bucket{le="0.1"} 3',
+        'chat_send_seconds_bucket{le="1"} 3',
+        'chat_send_seconds_bucket{le="+Inf"} 4',
+        "chat_send_seconds_sum 2.065",
+        "chat_send_seconds_count 4",
+    ]
+    assert "# TYPE chat_open_sockets gauge" in output and "chat_open_sockets 3" in output
+    assert "# TYPE sessions_hits_total counter" in output and "sessions_hits_total 5" in output
+    assert "sessions_hit_rate 0.5" in output
+    assert not any(line.startswith(("sessions_backend", "sessions_name", "sessions_flag")) for line in output)
+
+
+def test_metrics_endpoint(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    for name in ("chat_model_first_token_seconds_bucket", "chat_open_sockets", "sessions_resident_bytes",
+                 "sentiment_submitted_total", "log_dropped_total"):
+        assert name in response.text
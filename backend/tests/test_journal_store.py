@@ -0,0 +1,91 @@
+import asyncio
+import json
+from datetime import date, timedelta
+
+import pytest
+
+from journal_store import JournalStore, items_from_local_storage
+
+
+def days_ago(n):
+    return (date.today() - timedelta(days=n)).isoformat()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JournalStore(str(tmp_path / "journal.db"), batch_delay=0)
+    yield store
+    store.conn.close()
+
+
+def run(store, *items):
+    async def add_all():
+        return [await store.add(item) for item in items]
+
+    return asyncio.run(add_all())
+
+
+def stats(store, user_id):
+    return store.conn.execute(
+        "SELECT journal_count, mood_count, last_day, streak, longest_streak FROM user_stats WHERE user_id = ?",
+        (user_id,),
+    ).fetchone()
+
+
+def test_streak_counts_consecutive_days_and_resets_after_a_gap(store):
+    run(store, *(JournalStore.journal_item("u", "entry", days_ago(ago)) for ago in (6, 5, 4, 1, 0)))
+    assert stats(store, "u") == (5, 0, days_ago(0), 2, 3)
+
+
+def test_backfilled_day_recounts_streaks(store):
+    run(store, *(JournalStore.journal_item("u", "entry", days_ago(ago)) for ago in (4, 3, 1, 0)))
+    assert stats(store, "u")[3:] == (2, 2)
+
+    # Filling the gap joins both runs into one five-day streak
+    run(store, JournalStore.mood_item("u", 3, days_ago(2)))
+    assert stats(store, "u") == (4, 1, days_ago(0), 5, 5)
+
+
+def test_sentiment_only_days_do_not_count_towards_streaks(store):
+    run(store, JournalStore.journal_item("u", "entry", days_ago(3)), JournalStore.journal_item("u", "entry", days_ago(0)))
+    run(store, JournalStore.sentiment_item("u", "chat", days_ago(2), 0.5),
+        JournalStore.sentiment_item("u", "chat", days_ago(1), 0.5))
+    run(store, JournalStore.journal_item("u", "entry", days_ago(4)))
+    assert stats(store, "u")[3:] == (1, 2)
+
+
+def test_repeated_client_id_is_stored_once(store):
+    journal = JournalStore.journal_item("u", "first", days_ago(0), 0)
+    mood = JournalStore.mood_item("u", 4, days_ago(0), 0)
+    assert run(store, journal, mood, journal, mood) == [1, 1, 0, 0]
+    assert run(store, JournalStore.journal_item("u", "edited", days_ago(0), 0)) == [0]
+
+    assert stats(store, "u")[:2] == (1, 1)
+    report = store._report("u", 30)
+    assert report["moodData"] == [{"date": days_ago(0), "value": 4.0}]
+    assert report["journalData"] == [{"date": days_ago(0), "count": 1}]
+
+
+def test_journal_sentiment_is_counted_once(store):
+    run(store, JournalStore.journal_item("u", "entry", days_ago(0), "j"))
+    score = JournalStore.sentiment_item("u", "journal", days_ago(0), 0.8, "j")
+    assert run(store, score, score) == [1, 0]
+    assert store._report("u", 30)["sentimentData"] == [{"date": days_ago(0), "value": 0.8}]
+
+
+@pytest.mark.parametrize("value", [0, 5.5, 99, float("nan")])
+def test_mood_outside_scale_is_rejected(value):
+    with pytest.raises(ValueError):
+        JournalStore.mood_item("u", value)
+
+
+def test_items_from_local_storage_accepts_raw_strings():
+    dump = {
+        "journalEntries": json.dumps([{"id": 1, "content": "hello", "isoDate": "2024-03-01"}, {"id": 2, "content": ""}]),
+        "moods": [{"id": 3, "value": 4, "label": "Happy", "dateISO": "2024-03-02"}],
+        "journalStreak": "5",
+    }
+    items = items_from_local_storage("u", dump)
+    assert [(kind, fields["client_id"], fields["day"]) for kind, _, fields in items] == [
+        ("journal", "1", "2024-03-01"), ("mood", "3", "2024-03-02"),
+    ]
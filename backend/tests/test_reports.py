@@ -0,0 +1,64 @@
+from datetime import date, timedelta
+
+
+def days_ago(n):
+    return (date.today() - timedelta(days=n)).isoformat()
+
+
+def log_moods(client, user_id, moods):
+    for i, (ago, value) in enumerate(moods):
+        response = client.post(f"/users/{user_id}/moods", json={"value": value, "dateISO": days_ago(ago), "id": i})
+        assert response.status_code == 200
+
+
+def batch(client, patient_ids, headers=None):
+    return client.post("/reports/batch", json={"patientIds": patient_ids, "days": 30, "points": 30}, headers=headers)
+
+
+def test_batch_trend_matches_user_report(client):
+    # A week at 2 then a week at 5, ending a week ago: only the per-day means count
+    log_moods(client, "trend-a", [(ago, 2) for ago in range(20, 13, -1)] + [(ago, 5) for ago in range(13, 6, -1)])
+    # Many entries on one low day must not outweigh the other days of the window
+    log_moods(client, "trend-b", [(9, 4), (8, 4), (2, 3), (2, 3), (2, 3), (2, 3), (1, 5), (0, 5)])
+    log_moods(client, "trend-c", [(3, 4), (2, 3)])
+
+    patients = ["trend-a", "trend-b", "trend-c"]
+    reports = batch(client, patients).json()["patients"]
+    for patient_id in patients:
+        expected = client.get(f"/users/{patient_id}/report").json()["moodTrend"]
+        assert reports[patient_id]["moodTrend"] == expected
+    assert reports["trend-a"]["moodTrend"] == "Improving"
+
+
+def test_batch_etag_and_invalidation(client):
+    log_moods(client, "etag-a", [(1, 3)])
+    log_moods(client, "etag-b", [(1, 4)])
+
+    first = batch(client, ["etag-a", "etag-b", "etag-missing"])
+    assert first.status_code == 200
+    assert first.json()["patients"]["etag-missing"] is None
+    etag = first.headers["etag"]
+
+    assert batch(client, ["etag-a", "etag-b", "etag-missing"], {"If-None-Match": etag}).status_code == 304
+
+    client.post("/users/etag-a/moods", json={"value": 1, "dateISO": days_ago(0), "id": "new"})
+    second = batch(client, ["etag-a", "etag-b", "etag-missing"], {"If-None-Match": etag})
+    assert second.status_code == 200
+    assert second.headers["etag"] != etag
+    # Only the patient with new data is recomputed; the other comes from the cache
+    assert second.json()["patients"]["etag-a"]["moodAverage"] == 2.0
+    assert second.json()["patients"]["etag-b"] == first.json()["patients"]["etag-b"]
+
+
+def test_report_engine_invalidates_only_changed_patients(client):
+    import main
+
+    engine = main.report_engine
+    log_moods(client, "cache-a", [(0, 3)])
+    log_moods(client, "cache-b", [(0, 3)])
+    batch(client, ["cache-a", "cache-b"])
+    assert any(key[0] == "cache-a" for key in engine.cache)
+
+    client.post("/users/cache-a/journal", json={"content": "more", "id": "j1"})
+    assert not any(key[0] == "cache-a" for key in engine.cache)
+    assert any(key[0] == "cache-b" for key in engine.cache)
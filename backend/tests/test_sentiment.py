@@ -0,0 +1,35 @@
+import asyncio
+
+from sentiment import SentimentPipeline, score_text
+
+
+def test_score_text_handles_negation_and_intensifiers():
+    assert score_text("I feel happy") > 0
+    assert score_text("I do not feel happy") < 0
+    assert score_text("really sad") < score_text("sad") < 0
+    assert score_text("the meeting is on Tuesday") == 0
+
+
+def test_pipeline_scores_batches_in_worker_processes():
+    async def run():
+        results = []
+        done = asyncio.Event()
+
+        async def sink(scores):
+            results.extend(scores)
+            if len(results) == 3:
+                done.set()
+
+        pipeline = SentimentPipeline(sink, batch_size=2, max_delay=0.01, pool_size=1)
+        try:
+            for i, text in enumerate(["happy", "sad", "fine"]):
+                pipeline.submit("journal", "u", "2024-03-01", text, i)
+            await asyncio.wait_for(done.wait(), 30)
+        finally:
+            pipeline.close()
+        return pipeline, results
+
+    pipeline, results = asyncio.run(run())
+    assert sorted(ref for _, _, _, ref, _ in results) == [0, 1, 2]
+    assert pipeline.stats()["batches"] == 2
+    assert not pipeline.tasks
@@ -0,0 +1,140 @@
+import asyncio
+import time
+
+import pytest
+
+from providers import FakeProvider
+from sessions import SessionStore, SQLiteSessionBackend
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SQLiteSessionBackend(str(tmp_path / "sessions.db"))
+    yield backend
+    backend.conn.close()
+
+
+def test_idle_sessions_are_expired_on_disk(backend):
+    provider = FakeProvider(latency=0, tokens_per_sec=0)
+    store = SessionStore(provider, idle_ttl=60, backend=backend, expire_interval=0)
+    backend.put("old", provider.start_chat().to_state(), time.time() - 120)
+
+    asyncio.run(store.put("new", provider.start_chat()))
+
+    assert backend.get("old") == (None, None)
+    assert backend.get("new")[0] is not None
+    assert store.stats()["disk_expirations"] == 1
+
+
+def test_disk_sweep_waits_for_the_interval(backend):
+    provider = FakeProvider(latency=0, tokens_per_sec=0)
+    store = SessionStore(provider, idle_ttl=60, backend=backend, expire_interval=30)
+    backend.put("old", provider.start_chat().to_state(), time.time() - 120)
+
+    asyncio.run(store.put("new", provider.start_chat()))
+    assert backend.get("old")[0] is not None
+
+    store.disk_expired_at -= 30
+    asyncio.run(store.put("new", provider.start_chat()))
+    assert backend.get("old") == (None, None)
+
+
+def test_resident_bytes_follow_puts_and_evictions():
+    provider = FakeProvider(latency=0, tokens_per_sec=0)
+    store = SessionStore(provider, max_sessions=2)
+    sessions = [provider.start_chat("prompt") for _ in range(3)]
+
+    async def chat():
+        await store.put("a", sessions[0])
+        async for _ in sessions[0].stream("hello there"):
+            pass
+        await store.put("a", sessions[0])
+        reply = sessions[0].history.turns[-1]["text"]
+        assert store.resident_bytes == len("prompt") + len("hello there") + len(reply)
+        await store.put("b", sessions[1])
+        await store.put("c", sessions[2])
+
+    asyncio.run(chat())
+    stats = store.stats()
+    # "a" was evicted; "b" and "c" only hold their prompts
+    assert stats["resident_bytes"] == 2 * len("prompt")
+    assert stats["bytes_per_session"] == len("prompt")
+    assert stats["evictions"] == 1
+
+
+def chat(provider, text):
+    chat_session = provider.start_chat("prompt")
+
+    async def run():
+        async for _ in chat_session.stream(text):
+            pass
+
+    asyncio.run(run())
+    return chat_session
+
+
+def test_idle_sessions_expire_from_memory():
+    provider = FakeProvider(latency=0, tokens_per_sec=0)
+    store = SessionStore(provider, idle_ttl=60)
+    asyncio.run(store.put("a", chat(provider, "hello")))
+    assert asyncio.run(store.get("a")) is not None
+
+    store.expire_idle(now=time.time() + 61)
+    assert asyncio.run(store.get("a")) is None
+    stats = store.stats()
+    assert (stats["expirations"], stats["resident_sessions"], stats["resident_bytes"]) == (1, 0, 0)
+
+
+def test_second_store_resumes_from_the_shared_file(tmp_path):
+    provider = FakeProvider(latency=0, tokens_per_sec=0)
+    path = str(tmp_path / "sessions.db")
+    first = SessionStore(provider, backend=SQLiteSessionBackend(path))
+    second = SessionStore(provider, backend=SQLiteSessionBackend(path))
+    original = chat(provider, "hello")
+    asyncio.run(first.put("a", original))
+
+    resumed = asyncio.run(second.get("a"))
+    assert resumed.system_prompt == "prompt"
+    assert resumed.history.turns == original.history.turns
+    assert second.stats()["disk_hits"] == 1
+
+    # The first worker notices that the second continued the session and reloads it
+    continued = chat(provider, "again")
+    continued.history.turns = resumed.history.turns + continued.history.turns
+    time.sleep(0.01)
+    asyncio.run(second.put("a", continued))
+    reloaded = asyncio.run(first.get("a"))
+    assert len(reloaded.history.turns) == 4
+    assert first.stats()["disk_hits"] == 1
+
+
+def test_resume_over_the_socket(client):
+    import json
+
+    import main
+
+    def open_session(ws, session_id=None):
+        ws.send_text(json.dumps({"type": "config", "config": {"systemPrompt": "Be kind.", "sessionId": session_id}}))
+        return ws.receive_json()
+
+    def say(ws, text):
+        ws.send_text(json.dumps({"type": "text", "data": text}))
+        while ws.receive_json()["type"] != "turn_complete":
+            pass
+
+    with client.websocket_connect("/ws/webclient") as ws:
+        first = open_session(ws)
+        assert first["resumed"] is False
+        say(ws, "My name is Sam.")
+
+    with client.websocket_connect("/ws/webclient") as ws:
+        again = open_session(ws, first["sessionId"])
+        assert (again["sessionId"], again["resumed"], again["turns"]) == (first["sessionId"], True, 1)
+        say(ws, "Do you remember me?")
+
+    turns = main.session_store.sessions[first["sessionId"]][0].history.turns
+    assert [turn["text"] for turn in turns if turn["role"] == "user"] == ["My name is Sam.", "Do you remember me?"]
+
+    with client.websocket_connect("/ws/webclient") as ws:
+        unknown = open_session(ws, "no-such-session")
+        assert unknown["resumed"] is False and unknown["sessionId"] != "no-such-session"
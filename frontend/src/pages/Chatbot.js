@@ -7,14 +7,17 @@ import {
   Typography,
   TextField,
   IconButton,
+  Link,
 } from "@mui/material";
 import SendIcon from "@mui/icons-material/Send";
+import { Link as RouterLink } from "react-router-dom";
 
 function Chatbot() {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState("");
   const [isConnected, setIsConnected] = useState(false);
   const websocketRef = useRef(null);
+  const sessionIdRef = useRef(null);
   const messagesEndRef = useRef(null);
   const chatBoxRef = useRef(null);
 
@@ -55,6 +58,8 @@ function Chatbot() {
             "encourage self-reflection, and validate the user's experience. Never diagnose or offer medical advice. " +
             "If a user expresses signs of crisis or self-harm, recommend speaking to a trusted person or contacting a local helpline. " +
             "Maintain a calm, kind, and supportive tone in every message.",
+          // Resume the same conversation after a reconnect
+          sessionId: sessionIdRef.current,
         },
       };
       ws.send(JSON.stringify(config));
@@ -72,6 +77,19 @@ function Chatbot() {
               timestamp: new Date().toISOString(),
             },
           ]);
+        } else if (response.type === "crisis") {
+          setMessages((prev) => [
+            ...prev,
+            {
+              text: response.text,
+              sender: "bot",
+              timestamp: new Date().toISOString(),
+              resources: response.resources || [],
+              actionPlan: response.actionPlan,
+            },
+          ]);
+        } else if (response.type === "session") {
+          sessionIdRef.current = response.sessionId;
         } else if (response.type === "error") {
           console.error("Server error:", response.message);
         }
@@ -172,6 +190,29 @@ function Chatbot() {
                       <Typography variant="body1" style={{ whiteSpace: "pre-wrap" }}>
                         {message.text}
                       </Typography>
+                      {message.resources?.map((resource) => (
+                        <Typography key={resource.name} variant="body2" style={{ marginTop: "8px" }}>
+                          <strong>{resource.name}:</strong>{" "}
+                          {/^\d+$/.test(resource.contact) ? (
+                            <Link href={`tel:${resource.contact}`} color="inherit">
+                              {resource.contact}
+                            </Link>
+                          ) : (
+                            resource.contact
+                          )}
+                        </Typography>
+                      ))}
+                      {message.actionPlan && (
+                        <Link
+                          component={RouterLink}
+                          to={message.actionPlan}
+                          color="inherit"
+                          variant="body2"
+                          style={{ display: "block", marginTop: "8px", fontWeight: "bold" }}
+                        >
+                          Open your Critical Action Plan
+                        </Link>
+                      )}
                       <Typography
                         variant="caption"
                         style={{